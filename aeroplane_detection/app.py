@@ -2,11 +2,47 @@ import streamlit as st
 import cv2
 import av
 import numpy as np
+import os
+from concurrent.futures import TimeoutError
 from streamlit_webrtc import webrtc_streamer, VideoTransformerBase
-from ultralytics import YOLO
 
-# Load YOLO model
-model = YOLO("best.pt")
+from backends import load_model
+from batching import BatchingInference
+from detections import Detections
+from motion import GatedDetector, MotionGate
+from overlay import OverlayRenderer
+from tracker import JsonlEventSink, Tracker
+
+# Batching is shared by every viewer, so it is configured per server, not per session
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", "10"))
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "2.0"))
+# torch | onnx | onnx-int8 | openvino
+BACKEND = os.getenv("BACKEND", "torch")
+# Skip inference on frames where the scene hasn't changed (static cameras)
+MOTION_GATE = os.getenv("MOTION_GATE", "0") == "1"
+KEYFRAME_INTERVAL = int(os.getenv("KEYFRAME_INTERVAL", "30"))
+# Persistent aircraft IDs; events (track start/end, dwell time) go to TRACK_EVENTS if set
+TRACKING = os.getenv("TRACKING", "0") == "1"
+TRACK_EVENTS = os.getenv("TRACK_EVENTS")
+# Boxes shown (and tracks started) only above this score
+DISPLAY_CONF = 0.8
+# With tracking on, the model keeps low-score boxes too so the tracker can use
+# them to hold on to existing tracks (ByteTrack's second association round)
+TRACK_LOW_CONF = 0.1
+
+# Load YOLO model once per server process and share it across sessions
+@st.cache_resource
+def get_inference_server():
+    model = load_model("best.pt", BACKEND)
+    conf = TRACK_LOW_CONF if TRACKING else DISPLAY_CONF
+    return BatchingInference(model, max_batch=BATCH_SIZE, max_wait_ms=BATCH_WAIT_MS, conf=conf)
+
+inference = get_inference_server()
+
+@st.cache_resource
+def get_event_sink():
+    return JsonlEventSink(TRACK_EVENTS) if TRACK_EVENTS else None
 
 # Streamlit UI
 st.title("Aeroplanes Detection in Airport Imagery")
@@ -27,17 +63,62 @@ if start_button:
 if stop_button:
     st.session_state.webcam_active = False
 
+def run_inference(img):
+    """Run YOLO inference, batched with frames from the other sessions"""
+    future = inference.submit(img)
+    try:
+        return future.result(timeout=INFERENCE_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        return None
+
 class VideoTransformer(VideoTransformerBase):
+    def __init__(self):
+        # Each session watches its own camera, so each gets its own motion gate
+        self.gated = None
+        if MOTION_GATE:
+            self.gated = GatedDetector(self.detect, MotionGate(keyframe_interval=KEYFRAME_INTERVAL))
+        self.tracker = Tracker(high_threshold=DISPLAY_CONF, low_threshold=TRACK_LOW_CONF,
+                               event_sink=get_event_sink()) if TRACKING else None
+        self.renderer = OverlayRenderer(inference.model.names)
+
+    def detect(self, img):
+        result = run_inference(img)
+        return Detections.from_result(result) if result is not None else None
+
     def transform(self, frame):
-        img = frame.to_ndarray(format="bgr24")
+        # Convert once and draw straight into the converted frame: to_ndarray on a
+        # bgr24 frame is a writable view of its plane, so the annotated frame goes
+        # back out without from_ndarray's allocate-and-copy (~1 ms/frame at 720p)
+        out = frame.reformat(format="bgr24")
+        img = out.to_ndarray()
+        in_place = img.flags.writeable and np.may_share_memory(img, np.frombuffer(out.planes[0], np.uint8))
+        if not in_place:
+            # Older PyAV may hand back a read-only or copied array
+            img = img.copy()
 
-        # Run YOLO inference
-        results = model(img, conf=0.8)
+        # Carried-forward detections on unchanged frames
+        detections = self.gated(img) if self.gated is not None else self.detect(img)
+        if detections is None:
+            return frame
 
         # Annotate the frame
-        annotated_frame = results[0].plot()
+        if self.tracker is not None:
+            tracks = self.tracker.update(detections)
+            annotated_frame = self.renderer.draw(img, tracks.detections, tracks.labels(self.renderer.names))
+            cv2.putText(annotated_frame, f"aircraft: {self.tracker.active} now, {self.tracker.total_tracks} total",
+                        (10, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2, cv2.LINE_AA)
+        else:
+            annotated_frame = self.renderer.draw(img, detections[detections.scores >= DISPLAY_CONF])
+        if in_place:
+            return out
         return av.VideoFrame.from_ndarray(annotated_frame, format="bgr24")
 
+    def on_ended(self):
+        # End the session's tracks so their "end" and dwell events are written
+        if self.tracker is not None:
+            self.tracker.close()
+
 # Only start webcam if active
 if st.session_state.webcam_active:
     webrtc_streamer(key="example", video_transformer_factory=VideoTransformer)
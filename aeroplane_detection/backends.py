@@ -0,0 +1,76 @@
+"""Export best.pt to CPU-friendly runtimes and load any of them as a YOLO model.
+
+Every backend is loaded through ultralytics' YOLO wrapper, so the calling
+scripts keep the same predict API and Results objects whichever runtime
+executes the network.
+
+Usage:
+    python backends.py --backend onnx          # export best.onnx
+    python backends.py --backend onnx-int8     # export + dynamic INT8 quantization
+    python backends.py --backend openvino      # export best_openvino_model/
+"""
+import argparse
+from pathlib import Path
+
+from ultralytics import YOLO
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino")
+
+
+def exported_path(weights: str, backend: str) -> Path:
+    weights = Path(weights)
+    if backend == "torch":
+        return weights
+    if backend == "onnx":
+        return weights.with_suffix(".onnx")
+    if backend == "onnx-int8":
+        return weights.with_name(f"{weights.stem}_int8.onnx")
+    if backend == "openvino":
+        # Directory name ultralytics uses for OpenVINO exports
+        return weights.with_name(f"{weights.stem}_openvino_model")
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+
+def _is_stale(target: Path, weights: Path) -> bool:
+    return not target.exists() or target.stat().st_mtime < weights.stat().st_mtime
+
+
+def export(weights: str = "best.pt", backend: str = "onnx", imgsz: int = 640, force: bool = False) -> Path:
+    """Export weights for a backend unless an up-to-date export already exists."""
+    target = exported_path(weights, backend)
+    if backend == "torch" or not (force or _is_stale(target, Path(weights))):
+        return target
+
+    if backend == "onnx-int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        fp32 = export(weights, "onnx", imgsz, force)
+        quantize_dynamic(str(fp32), str(target), weight_type=QuantType.QUInt8)
+        return target
+
+    # Dynamic batch axis so batched callers (webrtc batching, tiling) work too
+    fmt = "onnx" if backend == "onnx" else "openvino"
+    exported = YOLO(str(weights)).export(format=fmt, imgsz=imgsz, dynamic=True, simplify=fmt == "onnx")
+    return Path(exported) if exported else target
+
+
+def load_model(weights: str = "best.pt", backend: str = "torch", imgsz: int = 640):
+    """Return a YOLO model for the requested backend, exporting on first use."""
+    if backend == "torch":
+        return YOLO(weights)
+    return YOLO(str(export(weights, backend, imgsz)), task="detect")
+
+
+def add_backend_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--backend", choices=BACKENDS, default="torch",
+                        help="runtime used for inference (exported from best.pt on first use)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export best.pt for CPU runtimes")
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--force", action="store_true", help="re-export even if up to date")
+    add_backend_argument(parser)
+    args = parser.parse_args()
+    print(export(args.weights, args.backend, args.imgsz, args.force))
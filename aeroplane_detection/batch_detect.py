@@ -0,0 +1,242 @@
+"""Bulk offline detection over image directories, globs and video files.
+
+Inputs are decoded by a thread pool into a bounded prefetch queue, run through
+the model in batches and written as one JSON line per image / video frame.
+Re-running with the same --output skips everything already written there, so
+an interrupted run picks up where it stopped. With --cache, images (or video
+frames) whose content was seen before reuse the stored detections instead of
+going through the model; cached images aren't even decoded.
+
+Usage:
+    python batch_detect.py "Aerial Airport.v1-v1.yolov11/test/images" clips/*.mp4 \\
+        --output detections.jsonl --parquet detections.parquet
+"""
+import argparse
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backends import add_backend_argument, load_model
+from detection_cache import add_cache_arguments, hash_array, hash_bytes, open_cache
+from detections import Detections
+from pipeline import peak_rss_mb
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+VIDEO_SUFFIXES = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm"}
+
+_DONE = object()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run aeroplane detection over many images/videos")
+    parser.add_argument("inputs", nargs="+", help="image/video files, directories or glob patterns")
+    parser.add_argument("--output", default="detections.jsonl", help="JSONL file (appended to, used for resume)")
+    parser.add_argument("--parquet", help="also export all results in --output to this Parquet file")
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--batch", type=int, default=16, help="images per forward pass")
+    parser.add_argument("--workers", type=int, default=4, help="decoder threads")
+    parser.add_argument("--prefetch", type=int, default=64, help="decoded frames kept ready ahead of the model")
+    parser.add_argument("--vid-stride", type=int, default=1, help="process every Nth video frame")
+    add_backend_argument(parser)
+    add_cache_arguments(parser)
+    return parser.parse_args()
+
+
+def expand_inputs(inputs):
+    """Resolve files, directories and globs into sorted image and video paths."""
+    images, videos = [], []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            candidates = (p for p in path.rglob("*") if p.is_file())
+        elif path.is_file():
+            candidates = [path]
+        else:
+            candidates = (Path(p) for p in glob.glob(item, recursive=True))
+        for candidate in candidates:
+            suffix = candidate.suffix.lower()
+            if suffix in IMAGE_SUFFIXES:
+                images.append(str(candidate))
+            elif suffix in VIDEO_SUFFIXES:
+                videos.append(str(candidate))
+    return sorted(set(images)), sorted(set(videos))
+
+
+def load_done(output: Path):
+    """Keys already written to output: image paths and 'video#frame' strings."""
+    done = set()
+    if not output.exists():
+        return done
+    with output.open() as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["key"])
+            except (ValueError, KeyError):
+                continue  # a line cut short by the interruption
+    return done
+
+
+def decode(images, videos, done, workers, prefetch, vid_stride, cache=None):
+    """Yield (key, source, frame_index, image, content_hash, cache_entry) from a pool of decoder threads.
+
+    content_hash and cache_entry are None without a cache; image is None for cache hits on image files.
+    """
+    frames = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item):
+        # Bounded put that gives up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read_image(path):
+        if cache is None:
+            put((path, path, None, cv2.imread(path), None, None))
+            return
+        data = Path(path).read_bytes()
+        content_hash = hash_bytes(data)
+        entry = cache.get(content_hash)
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if entry is None else None
+        put((path, path, None, image, content_hash, entry))
+
+    def read_video(path):
+        cap = cv2.VideoCapture(path)
+        index = 0
+        while cap.isOpened() and not stop.is_set():
+            if not cap.grab():
+                break
+            key = f"{path}#{index}"
+            if index % vid_stride == 0 and key not in done:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                content_hash = hash_array(frame) if cache is not None else None
+                put((key, path, index, frame, content_hash, cache.get(content_hash) if cache is not None else None))
+            index += 1
+        cap.release()
+
+    def feed():
+        futures = [pool.submit(read_video, v) for v in videos]
+        futures += [pool.submit(read_image, p) for p in images if p not in done]
+        wait(futures)
+        for future in futures:
+            if not future.cancelled() and future.exception():
+                print(f"Decoder error: {future.exception()}")
+        put(_DONE)
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode")
+    threading.Thread(target=feed, daemon=True).start()
+    try:
+        while (item := frames.get()) is not _DONE:
+            yield item
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def to_record(key, source, frame_index, height, width, detections: Detections, names):
+    return {
+        "key": key,
+        "source": source,
+        "frame": frame_index,
+        "height": height,
+        "width": width,
+        "detections": [
+            {"class": names[int(c)], "score": round(float(s), 4), "box": [round(float(v), 1) for v in b]}
+            for b, s, c in zip(detections.boxes, detections.scores, detections.classes)
+        ],
+    }
+
+
+def export_parquet(jsonl: Path, target: Path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("--parquet needs pyarrow (pip install pyarrow)")
+    with jsonl.open() as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    pq.write_table(pa.Table.from_pylist(rows), target)
+
+
+def ends_with_newline(path: Path) -> bool:
+    """Whether the file's last byte is a newline, without reading the rest of it."""
+    with path.open("rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def main():
+    args = parse_args()
+    output = Path(args.output)
+    images, videos = expand_inputs(args.inputs)
+    done = load_done(output)
+    print(f"{len(images)} images, {len(videos)} videos, {len(done)} results already in {output}")
+
+    model = load_model("best.pt", args.backend, args.imgsz)
+    cache = open_cache(args)
+    processed = 0
+    started = time.perf_counter()
+
+    def flush(batch, f):
+        results = model([item[3] for item in batch], conf=args.conf, imgsz=args.imgsz, verbose=False)
+        fresh = []
+        for (key, source, frame_index, image, content_hash, _), result in zip(batch, results):
+            detections = Detections.from_result(result)
+            record = to_record(key, source, frame_index, *image.shape[:2], detections, model.names)
+            f.write(json.dumps(record) + "\n")
+            if content_hash is not None:
+                fresh.append((content_hash, detections, *image.shape[:2]))
+        f.flush()
+        if cache is not None and fresh:
+            cache.put_many(fresh)
+        batch.clear()
+
+    with output.open("a") as f:
+        if f.tell() and not ends_with_newline(output):
+            f.write("\n")  # terminate a line cut short by the interruption
+        batch = []
+        for item in decode(images, videos, done, args.workers, args.prefetch, args.vid_stride, cache):
+            key, source, frame_index, image, _, entry = item
+            if entry is not None:
+                record = to_record(key, source, frame_index, entry.height, entry.width, entry.detections, model.names)
+                f.write(json.dumps(record) + "\n")
+                processed += 1
+                continue
+            if image is None:
+                print(f"Skipping unreadable image {source}")
+                continue
+            batch.append(item)
+            processed += 1
+            if len(batch) == args.batch:
+                flush(batch, f)
+        if batch:
+            flush(batch, f)
+
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"{processed} images in {elapsed:.1f}s ({rate:.1f} images/s), peak RSS {peak_rss_mb():.0f} MiB")
+    if cache is not None:
+        print(f"Detection cache: {cache.hits} hits, {cache.misses} misses ({cache.hit_rate:.0%})")
+        cache.close()
+
+    if args.parquet:
+        export_parquet(output, Path(args.parquet))
+        print(f"Wrote {args.parquet}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Micro-batching front end for a shared YOLO model.
+
+Callers on any thread submit single frames; one worker thread collects
+whatever arrives within a short window (up to max_batch frames) and runs
+them as a single batched forward pass, then hands each caller its own
+Results object. The worker is also the only thread that touches the model,
+so concurrent sessions no longer contend on the predictor.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Optional
+
+
+class BatchingInference:
+    def __init__(self, model, max_batch: int = 8, max_wait_ms: float = 10.0, **predict_kwargs):
+        """
+        Args:
+            model: Loaded YOLO model (or any callable taking a list of images)
+            max_batch: Largest number of frames per forward pass
+            max_wait_ms: How long the first frame of a batch waits for company
+            **predict_kwargs: Passed to every model call (e.g. conf=0.8)
+        """
+        self.model = model
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.predict_kwargs = {"verbose": False, **predict_kwargs}
+
+        self.batches = 0
+        self.frames = 0
+
+        self._requests = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="batching-inference", daemon=True)
+        self._worker.start()
+
+    def submit(self, image) -> Future:
+        """Queue one frame and return a Future resolving to its Results."""
+        if self._closed:
+            raise RuntimeError("BatchingInference is closed")
+        future = Future()
+        self._requests.put((image, future))
+        return future
+
+    def __call__(self, image, timeout: Optional[float] = None) -> Any:
+        return self.submit(image).result(timeout=timeout)
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.frames / self.batches if self.batches else 0.0
+
+    def close(self):
+        self._closed = True
+        self._requests.put(None)
+        self._worker.join(timeout=5.0)
+
+    def _collect(self):
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then let the worker see the sentinel again
+                self._requests.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+            # Drop frames whose caller already gave up waiting
+            batch = [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.model([image for image, _ in batch], **self.predict_kwargs)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.frames += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,169 @@
+"""Speed and accuracy benchmark for best.pt on the Aerial Airport splits.
+
+Every combination of backend, image size, batch size and thread count runs in
+its own subprocess, so thread settings apply from the start and peak RSS is
+per configuration. Each run reports p50/p95 latency, throughput and peak RSS.
+mAP50 / mAP50-95 come from model.val() once per backend, imgsz and split,
+because batch size and threads don't change accuracy.
+
+Results are appended as JSON lines. With --baseline, the run is compared to
+an earlier results file and exits non-zero on a regression beyond --tolerance.
+
+Usage:
+    python benchmark.py --backends torch onnx --imgsz 480 640 --batch 1 8 --threads 1 4
+    python benchmark.py --baseline benchmark_prev.jsonl
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from itertools import product
+from pathlib import Path
+
+from backends import BACKENDS
+
+DATASET = Path(__file__).parent / "Aerial Airport.v1-v1.yolov11"
+SPLITS = {"valid": "val", "test": "test"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark aeroplane detection speed and accuracy")
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--splits", nargs="+", default=["valid", "test"], choices=list(SPLITS))
+    parser.add_argument("--backends", nargs="+", default=["torch"], choices=BACKENDS)
+    parser.add_argument("--imgsz", nargs="+", type=int, default=[640])
+    parser.add_argument("--batch", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count() or 1])
+    parser.add_argument("--warmup", type=int, default=3, help="untimed batches before measuring")
+    parser.add_argument("--no-map", action="store_true", help="skip accuracy, measure speed only")
+    parser.add_argument("--output", default="benchmark.jsonl")
+    parser.add_argument("--baseline", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed relative slowdown / mAP drop vs the baseline")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def run_config(config):
+    """Measure one configuration; runs inside the worker subprocess."""
+    import numpy as np
+    import torch
+
+    from backends import load_model
+    from pipeline import peak_rss_mb
+
+    torch.set_num_threads(config["threads"])
+    model = load_model(config["weights"], config["backend"], config["imgsz"])
+    images = sorted(str(p) for p in (DATASET / config["split"] / "images").glob("*.jpg"))
+    batch = config["batch"]
+    batches = [images[i:i + batch] for i in range(0, len(images), batch)]
+
+    def predict(paths):
+        return model(paths, imgsz=config["imgsz"], conf=0.25, verbose=False)
+
+    for paths in (batches * config["warmup"])[:config["warmup"]]:
+        predict(paths)
+
+    latencies = []
+    started = time.perf_counter()
+    for paths in batches:
+        start = time.perf_counter()
+        predict(paths)
+        latencies.append((time.perf_counter() - start) / len(paths))
+    elapsed = time.perf_counter() - started
+    latencies = np.array(latencies) * 1000.0
+
+    row = dict(config)
+    row.update({
+        "images": len(images),
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "throughput_ips": round(len(images) / elapsed, 2),
+        # Read before val(), whose dataloader would otherwise set the peak
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    })
+    if config["map"]:
+        metrics = model.val(
+            data=str(DATASET / "data.yaml"), split=SPLITS[config["split"]], imgsz=config["imgsz"],
+            batch=batch, plots=False, verbose=False,
+        )
+        row.update({"map50": round(float(metrics.box.map50), 4), "map50_95": round(float(metrics.box.map), 4)})
+    return row
+
+
+def spawn(config):
+    env = dict(os.environ)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        env[var] = str(config["threads"])
+    proc = subprocess.run(
+        [sys.executable, __file__, "--worker", json.dumps(config)],
+        cwd=Path(__file__).parent, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return dict(config, error=proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def config_key(row):
+    return tuple(row.get(k) for k in ("backend", "split", "imgsz", "batch", "threads"))
+
+
+def find_regressions(rows, baseline_path, tolerance):
+    baseline = {}
+    with open(baseline_path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                baseline[config_key(row)] = row
+    regressions = []
+    for row in rows:
+        old = baseline.get(config_key(row))
+        if old is None or "error" in row or "error" in old:
+            continue
+        for metric in ("latency_p50_ms", "latency_p95_ms"):
+            if row[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{config_key(row)} {metric}: {old[metric]} -> {row[metric]}")
+        if row["throughput_ips"] < old["throughput_ips"] * (1 - tolerance):
+            regressions.append(f"{config_key(row)} throughput_ips: {old['throughput_ips']} -> {row['throughput_ips']}")
+        for metric in ("map50", "map50_95"):
+            if metric in row and metric in old and row[metric] < old[metric] * (1 - tolerance):
+                regressions.append(f"{config_key(row)} {metric}: {old[metric]} -> {row[metric]}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        print(json.dumps(run_config(json.loads(args.worker))))
+        return
+
+    meta = {
+        "weights": args.weights,
+        "weights_mtime": os.path.getmtime(args.weights) if os.path.exists(args.weights) else None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "warmup": args.warmup,
+    }
+    rows, measured_map = [], set()
+    for backend, split, imgsz, batch, threads in product(args.backends, args.splits, args.imgsz, args.batch, args.threads):
+        accuracy_key = (backend, split, imgsz)
+        config = dict(meta, backend=backend, split=split, imgsz=imgsz, batch=batch, threads=threads,
+                      map=not args.no_map and accuracy_key not in measured_map)
+        measured_map.add(accuracy_key)
+        row = spawn(config)
+        rows.append(row)
+        print(json.dumps(row))
+        with open(args.output, "a") as f:
+            f.write(json.dumps(row) + "\n")
+
+    if args.baseline:
+        regressions = find_regressions(rows, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
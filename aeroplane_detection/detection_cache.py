@@ -0,0 +1,163 @@
+"""Persistent detection cache keyed by image content.
+
+Entries are keyed by a hash of the image (the encoded file bytes for images
+on disk, the pixel buffer for decoded video frames) together with a hash of
+the inference config (backend, conf, imgsz, ...). Every entry also records
+the hash of the weights it came from; opening the cache with different
+weights drops the old entries, so retraining best.pt invalidates it without
+any bookkeeping. The least recently used entries are evicted once the cache
+holds more than max_entries images.
+
+One SQLite connection is shared behind a lock, so decoder threads can look
+images up while the main thread stores new results.
+
+Usage:
+    python test.py "Aerial Airport.v1-v1.yolov11/test/images" --no-show --cache
+    python batch_detect.py "Aerial Airport.v1-v1.yolov11/test/images" --cache
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from detections import Detections
+
+
+def hash_bytes(data) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_file(path) -> str:
+    """Content hash of an encoded image file; doesn't need it decoded."""
+    return hash_bytes(Path(path).read_bytes())
+
+
+def hash_array(image: np.ndarray) -> str:
+    """Content hash of a decoded frame, including its shape."""
+    digest = hashlib.blake2b(str(image.shape).encode(), digest_size=16)
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    detections: Detections
+    height: int
+    width: int
+
+
+class DetectionCache:
+    def __init__(self, path: str, weights: str = "best.pt", max_entries: int = 100_000, **config):
+        """
+        Args:
+            path: SQLite file, created if missing
+            weights: Weights the cached detections come from; hashed by content
+            max_entries: Images kept before the least recently used are evicted
+            **config: Anything else that changes the detections (backend, conf, imgsz, ...)
+        """
+        self.max_entries = max_entries
+        self.weights_hash = hash_file(weights)
+        self.config_hash = hash_bytes(json.dumps(config, sort_keys=True).encode())
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        with self._lock, self._db:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    image TEXT NOT NULL,
+                    config TEXT NOT NULL,
+                    weights TEXT NOT NULL,
+                    detections BLOB NOT NULL,
+                    height INTEGER NOT NULL,
+                    width INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (image, config)
+                );
+                CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            """)
+            # Results from any other weights are stale
+            self._db.execute("DELETE FROM entries WHERE weights != ?", (self.weights_hash,))
+            # Kept up to date by put_many, so eviction doesn't count the table on every write
+            self._count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get(self, image_hash: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT detections, height, width FROM entries WHERE image = ? AND config = ?",
+                (image_hash, self.config_hash),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._db:
+                self._db.execute("UPDATE entries SET last_used = ? WHERE image = ? AND config = ?",
+                                 (time.time(), image_hash, self.config_hash))
+        detections = Detections.from_array(np.frombuffer(row[0], np.float32))
+        return CacheEntry(detections, row[1], row[2])
+
+    def put_many(self, items):
+        """Store (image_hash, detections, height, width) tuples, then evict down to max_entries."""
+        now = time.time()
+        # Keyed by hash so an image repeated within the batch counts once
+        rows = {
+            image_hash: (image_hash, self.config_hash, self.weights_hash,
+                         detections.to_array().astype(np.float32).tobytes(), int(height), int(width), now)
+            for image_hash, detections, height, width in items
+        }
+        if not rows:
+            return
+        with self._lock, self._db:
+            # Replaced entries don't grow the table; a primary key lookup per image finds them
+            existing = self._db.execute(
+                f"SELECT COUNT(*) FROM entries WHERE config = ? AND image IN ({','.join('?' * len(rows))})",
+                (self.config_hash, *rows),
+            ).fetchone()[0]
+            self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", rows.values())
+            self._count += len(rows) - existing
+            excess = self._count - self.max_entries
+            if excess > 0:
+                evicted = self._db.execute(
+                    "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                ).rowcount
+                self._count -= evicted
+
+    def put(self, image_hash: str, detections: Detections, height: int, width: int):
+        self.put_many([(image_hash, detections, height, width)])
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_cache(args: argparse.Namespace, weights: str = "best.pt", sliced: bool = False) -> Optional[DetectionCache]:
+    """Open the cache requested by add_cache_arguments' flags, or None without --cache.
+
+    Every tool builds its config here, so test.py and batch_detect.py runs
+    with the same settings share entries.
+    """
+    if not args.cache:
+        return None
+    return DetectionCache(args.cache, weights, args.cache_size, backend=args.backend, conf=args.conf,
+                          imgsz=args.imgsz, sliced=sliced)
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--cache", nargs="?", const="detections_cache.sqlite",
+                        help="reuse detections for images seen before (default file: detections_cache.sqlite)")
+    parser.add_argument("--cache-size", type=int, default=100_000, help="images kept in the detection cache")
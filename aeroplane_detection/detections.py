@@ -0,0 +1,132 @@
+"""Backend-neutral detection arrays and the box maths shared by the tools here."""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class Detections:
+    boxes: np.ndarray  # (N, 4) float32 xyxy in pixels
+    scores: np.ndarray  # (N,) float32
+    classes: np.ndarray  # (N,) int32
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int32))
+
+    @classmethod
+    def from_result(cls, result):
+        """Convert one ultralytics Results object."""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls.empty()
+        return cls(
+            boxes.xyxy.cpu().numpy().astype(np.float32),
+            boxes.conf.cpu().numpy().astype(np.float32),
+            boxes.cls.cpu().numpy().astype(np.int32),
+        )
+
+    @classmethod
+    def from_array(cls, array):
+        """Inverse of to_array: (N, 6) rows of x1, y1, x2, y2, score, class."""
+        array = np.asarray(array, np.float32).reshape(-1, 6)
+        return cls(array[:, :4].copy(), array[:, 4].copy(), array[:, 5].astype(np.int32))
+
+    def to_array(self) -> np.ndarray:
+        return np.concatenate(
+            [self.boxes, self.scores[:, None], self.classes[:, None].astype(np.float32)], axis=1
+        )
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __getitem__(self, index):
+        return Detections(self.boxes[index], self.scores[index], self.classes[index])
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes, returned as (N, M)."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), np.float32)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def greedy_match(iou: np.ndarray, threshold: float = 0.5):
+    """Match rows to columns by descending IoU; returns (rows, cols) index arrays."""
+    if iou.size == 0:
+        return np.zeros(0, np.intp), np.zeros(0, np.intp)
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind="stable")
+    used_rows, used_cols, matched_rows, matched_cols = set(), set(), [], []
+    for r, c in zip(rows[order], cols[order]):
+        if r not in used_rows and c not in used_cols:
+            used_rows.add(r)
+            used_cols.add(c)
+            matched_rows.append(r)
+            matched_cols.append(c)
+    return np.array(matched_rows, np.intp), np.array(matched_cols, np.intp)
+
+
+def compare(reference: Detections, candidate: Detections, iou_threshold: float = 0.5) -> dict:
+    """Agreement of candidate detections with a reference set for the same image."""
+    iou = box_iou(reference.boxes, candidate.boxes)
+    same_class = reference.classes[:, None] == candidate.classes[None, :]
+    rows, cols = greedy_match(np.where(same_class, iou, 0.0), iou_threshold)
+    return {
+        "reference": len(reference),
+        "candidate": len(candidate),
+        "matched": len(rows),
+        "iou_sum": float(iou[rows, cols].sum()),
+        "score_delta_max": float(np.abs(reference.scores[rows] - candidate.scores[cols]).max()) if len(rows) else 0.0,
+    }
+
+
+def nms(detections: Detections, threshold: float = 0.5, metric: str = "iou") -> Detections:
+    """Class-aware greedy NMS.
+
+    metric="ios" measures overlap as intersection over the smaller box, which
+    also suppresses a plane clipped by a tile edge in favour of the whole one.
+    """
+    if len(detections) == 0:
+        return detections
+    # Shift each class into its own coordinate range so classes never suppress each other
+    boxes = detections.boxes + detections.classes[:, None] * (detections.boxes.max() + 1.0)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-detections.scores, kind="stable")
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        lt = np.maximum(boxes[i, :2], boxes[rest, :2])
+        rb = np.minimum(boxes[i, 2:], boxes[rest, 2:])
+        inter = np.clip(rb - lt, 0, None).prod(axis=1)
+        if metric == "ios":
+            overlap = inter / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        else:
+            overlap = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[overlap <= threshold]
+    return detections[np.array(keep, np.intp)]
+
+
+_renderers = {}
+
+
+def draw_detections(image, detections: Detections, names=None, labels=None):
+    """Draw boxes and labels onto image in place and return it.
+
+    Shared entry point for scripts that just want an annotated image; it goes
+    through an OverlayRenderer (one per class-name table), so label patches
+    are cached across calls.
+    """
+    from overlay import OverlayRenderer
+
+    key = tuple(sorted(names.items())) if isinstance(names, dict) else tuple(names or ())
+    renderer = _renderers.get(key)
+    if renderer is None:
+        renderer = _renderers[key] = OverlayRenderer(names)
+    return renderer.draw(image, detections, labels)
@@ -1,31 +1,149 @@
+import argparse
+from pathlib import Path
+
 import cv2
-from ultralytics import YOLO
 
-model = YOLO("best.pt")  
-# Open the webcam (0 is the default webcam, change it if needed)
-cap = cv2.VideoCapture(0)
+from backends import add_backend_argument, load_model
+from detections import Detections
+from motion import GatedDetector, add_gate_arguments, gate_from_args
+from overlay import OverlayRenderer
+from pipeline import open_capture, run_pipelined
+from tracker import JsonlEventSink, Tracker
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Live aeroplane detection from a webcam or video")
+    parser.add_argument("--source", nargs="+", default=["0"],
+                        help="camera indices, RTSP URLs or video files; more than one runs multi-stream mode")
+    parser.add_argument("--conf", type=float, default=0.8, help="confidence threshold")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="capture, infer and render on separate threads, dropping stale frames")
+    parser.add_argument("--stats-every", type=float, default=5.0,
+                        help="seconds between latency/FPS reports in pipelined and multi-stream mode")
+    parser.add_argument("--track", action="store_true", help="track aircraft with persistent IDs")
+    parser.add_argument("--track-events", help="append track start/end events to this JSONL file")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="multi-stream: most frames from different cameras per forward pass")
+    parser.add_argument("--batch-wait-ms", type=float, default=10.0,
+                        help="multi-stream: how long a frame waits for others to batch with")
+    parser.add_argument("--output-dir", help="multi-stream: write each annotated stream to <dir>/<name>.mp4")
+    parser.add_argument("--no-show", action="store_true", help="multi-stream: don't open a window per stream")
+    add_backend_argument(parser)
+    add_gate_arguments(parser)
+    return parser.parse_args()
+
+
+def run_sequential(cap, infer, render):
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break  # Exit if the frame is not captured
+
+        # Run YOLO inference on the frame and draw the results
+        annotated_frame = render(frame, infer(frame))
+
+        # Display the frame with detections
+        cv2.imshow("res", annotated_frame)
+
+        # Press 'q' to exit
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+
+
+def run_multistream(args, model):
+    from batching import BatchingInference
+    from multistream import DisplaySink, Stream, VideoSink, run_streams
+
+    # One batched model serves every camera; gating, tracking and drawing stay per stream
+    detect_conf = min(args.conf, 0.1) if args.track else args.conf
+    inference = BatchingInference(model, max_batch=args.batch_size, max_wait_ms=args.batch_wait_ms, conf=detect_conf)
+    display = None if args.no_show else DisplaySink()
+    video = VideoSink(args.output_dir) if args.output_dir else None
+    sinks = [sink for sink in (display, video) if sink is not None]
+    events = JsonlEventSink(args.track_events) if args.track_events else None
+
+    def sink(name, frame, fps):
+        for s in sinks:
+            s(name, frame, fps)
+
+    def make_stream(index, source):
+        name = f"{index}:{Path(source).name if Path(source).is_file() else source}"
+        renderer = OverlayRenderer(model.names)
+        detect = lambda frame: Detections.from_result(inference(frame))
+        if args.motion_gate:
+            detect = GatedDetector(detect, gate_from_args(args))
+        infer, render, tracker = detect, renderer.draw, None
+        if args.track:
+            tracker = Tracker(high_threshold=args.conf,
+                              event_sink=(lambda event: events(dict(event, stream=name))) if events else None)
+            infer = lambda frame: tracker.update(detect(frame))
+            render = lambda frame, tracks: renderer.draw(frame, tracks.detections, tracks.labels(model.names))
+        return Stream(name, source, infer, render, sink if sinks else None), tracker
+
+    streams, trackers = zip(*(make_stream(i, source) for i, source in enumerate(args.source)))
+    try:
+        run_streams(list(streams), display=display, stats_every=args.stats_every, inference=inference)
+    finally:
+        inference.close()
+        for tracker in trackers:
+            if tracker is not None:
+                tracker.close()
+        if args.track:
+            print(f"Tracked {sum(t.total_tracks for t in trackers)} aircraft")
+        if events is not None:
+            events.close()
+        if video is not None:
+            video.close()
+        cv2.destroyAllWindows()
 
-cap.set(3, 640)  # Width
-cap.set(4, 480)  # Height
 
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break  # Exit if the frame is not captured
+def main():
+    args = parse_args()
+    model = load_model("best.pt", args.backend)
+    if len(args.source) > 1:
+        run_multistream(args, model)
+        return
+    cap = open_capture(args.source[0])
 
-    # Run YOLO inference on the frame
-    results = model(frame, conf = 0.8)
+    # Draws straight into the captured frame instead of plot()'s re-rendered copy
+    renderer = OverlayRenderer(model.names)
+    # The tracker wants low-score boxes too: --conf then only gates new tracks
+    detect_conf = min(args.conf, 0.1) if args.track else args.conf
+    detect = lambda frame: Detections.from_result(model(frame, conf=detect_conf, verbose=not args.pipelined)[0])
+    if args.motion_gate:
+        detect = GatedDetector(detect, gate_from_args(args))
+    infer = detect
+    render = renderer.draw
 
-    # Plot the results directly on the frame
-    annotated_frame = results[0].plot()
+    tracker = events = None
+    if args.track:
+        events = JsonlEventSink(args.track_events) if args.track_events else None
+        tracker = Tracker(high_threshold=args.conf, event_sink=events)
+        infer = lambda frame: tracker.update(detect(frame))
+        render = lambda frame, tracks: renderer.draw(frame, tracks.detections, tracks.labels(model.names))
 
-    # Display the frame with detections
-    cv2.imshow("res", annotated_frame)
+    try:
+        if args.pipelined:
+            run_pipelined(
+                cap,
+                infer=infer,
+                render=lambda packet: render(packet.image, packet.results),
+                stats_every=args.stats_every,
+            )
+        else:
+            run_sequential(cap, infer, render)
+    finally:
+        if args.motion_gate:
+            print(f"Skipped inference on {detect.gate.skip_fraction:.1%} of {detect.gate.frames} frames")
+        if tracker is not None:
+            tracker.close()
+            print(f"Tracked {tracker.total_tracks} aircraft")
+        if events is not None:
+            events.close()
+        # Release resources
+        cap.release()
+        cv2.destroyAllWindows()
 
-    # Press 'q' to exit
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
 
-# Release resources
-cap.release()
-cv2.destroyAllWindows()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Motion-gated inference for mostly static airport cameras.
+
+MotionGate compares a small grayscale thumbnail of each frame with the one
+from the last inferred frame and only asks for inference when enough pixels
+changed, or when a keyframe is due. On skipped frames CarryForward replays
+the last detections, shifted by the per-box velocity seen between the last
+two inferences.
+
+Run as a script to measure skip rate and accuracy against full inference:
+    python motion.py --split test --hold 30
+    python motion.py --video apron.mp4
+"""
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backends import add_backend_argument, load_model
+from detections import Detections, box_iou, compare, greedy_match
+
+
+class MotionGate:
+    def __init__(self, threshold: float = 0.01, pixel_delta: int = 25, keyframe_interval: int = 30, width: int = 96):
+        """
+        Args:
+            threshold: Fraction of thumbnail pixels that must change to trigger inference
+            pixel_delta: Grey-level difference for a pixel to count as changed
+            keyframe_interval: Force inference at least every N frames (0 disables)
+            width: Thumbnail width the comparison runs at
+        """
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.keyframe_interval = keyframe_interval
+        self.width = width
+        self._reference = None
+        self._since_inference = 0
+        self.frames = 0
+        self.inferred = 0
+
+    def _thumbnail(self, frame):
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (3, 3), 0)
+
+    def should_infer(self, frame) -> bool:
+        self.frames += 1
+        thumbnail = self._thumbnail(frame)
+        keyframe_due = self.keyframe_interval and self._since_inference + 1 >= self.keyframe_interval
+        if self._reference is None or keyframe_due:
+            changed = True
+        else:
+            diff = cv2.absdiff(thumbnail, self._reference)
+            changed = np.count_nonzero(diff > self.pixel_delta) > self.threshold * diff.size
+        if changed:
+            # Compare against the last inferred frame so slow drift still adds up
+            self._reference = thumbnail
+            self._since_inference = 0
+            self.inferred += 1
+        else:
+            self._since_inference += 1
+        return changed
+
+    @property
+    def skip_fraction(self) -> float:
+        return 1.0 - self.inferred / self.frames if self.frames else 0.0
+
+
+class CarryForward:
+    """Constant-velocity extrapolation of the last inferred detections."""
+
+    def __init__(self, match_iou: float = 0.3):
+        self.match_iou = match_iou
+        self._last = Detections.empty()
+        self._velocity = np.zeros((0, 4), np.float32)
+        self._last_index = 0
+
+    def update(self, detections: Detections, frame_index: int):
+        velocity = np.zeros((len(detections), 4), np.float32)
+        elapsed = frame_index - self._last_index
+        if len(self._last) and len(detections) and elapsed > 0:
+            rows, cols = greedy_match(box_iou(self._last.boxes, detections.boxes), self.match_iou)
+            velocity[cols] = (detections.boxes[cols] - self._last.boxes[rows]) / elapsed
+        self._last, self._velocity, self._last_index = detections, velocity, frame_index
+
+    def predict(self, frame_index: int) -> Detections:
+        if not len(self._last):
+            return self._last
+        shift = self._velocity * (frame_index - self._last_index)
+        return Detections(self._last.boxes + shift, self._last.scores, self._last.classes)
+
+
+class GatedDetector:
+    """Wraps a frame -> Detections callable with a MotionGate and CarryForward.
+
+    detect may return None (e.g. an inference timeout); the carried-forward
+    detections are used for that frame instead.
+    """
+
+    def __init__(self, detect, gate: MotionGate = None, tracker: CarryForward = None):
+        self.detect = detect
+        self.gate = gate or MotionGate()
+        self.tracker = tracker or CarryForward()
+        self._index = 0
+
+    def __call__(self, frame) -> Detections:
+        self._index += 1
+        if self.gate.should_infer(frame):
+            detections = self.detect(frame)
+            if detections is not None:
+                self.tracker.update(detections, self._index)
+                return detections
+        return self.tracker.predict(self._index)
+
+
+def add_gate_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="only run the model when the scene changes (or on keyframes)")
+    parser.add_argument("--motion-threshold", type=float, default=0.01,
+                        help="fraction of changed pixels that triggers inference")
+    parser.add_argument("--keyframe-interval", type=int, default=30,
+                        help="run the model at least every N frames")
+
+
+def gate_from_args(args) -> MotionGate:
+    return MotionGate(threshold=args.motion_threshold, keyframe_interval=args.keyframe_interval)
+
+
+def simulated_feed(paths, hold, noise, seed=0):
+    """Each still held for `hold` frames with sensor noise, like a static camera."""
+    rng = np.random.default_rng(seed)
+    for path in paths:
+        image = cv2.imread(str(path)).astype(np.int16)
+        for _ in range(hold):
+            jitter = rng.normal(0, noise, image.shape).astype(np.int16)
+            yield np.clip(image + jitter, 0, 255).astype(np.uint8)
+
+
+def video_feed(path):
+    cap = cv2.VideoCapture(path)
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+    cap.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure motion-gated inference against full inference")
+    parser.add_argument("--video", help="evaluate on a video instead of the dataset split")
+    parser.add_argument("--split", default="test", choices=["train", "valid", "test"])
+    parser.add_argument("--hold", type=int, default=30, help="frames each still is held for")
+    parser.add_argument("--noise", type=float, default=2.0, help="sensor noise sigma for held stills")
+    parser.add_argument("--conf", type=float, default=0.8)
+    parser.add_argument("--iou", type=float, default=0.5)
+    add_gate_arguments(parser)
+    add_backend_argument(parser)
+    args = parser.parse_args()
+
+    model = load_model("best.pt", args.backend)
+
+    def detect(frame):
+        return Detections.from_result(model(frame, conf=args.conf, verbose=False)[0])
+
+    if args.video:
+        frames = video_feed(args.video)
+    else:
+        split = Path(__file__).parent / "Aerial Airport.v1-v1.yolov11" / args.split / "images"
+        frames = simulated_feed(sorted(split.glob("*.jpg")), args.hold, args.noise)
+
+    gated = GatedDetector(detect, gate_from_args(args))
+    comparisons, gated_time = [], 0.0
+    for frame in frames:
+        reference = detect(frame)
+        start = time.perf_counter()
+        comparisons.append(compare(reference, gated(frame), args.iou))
+        gated_time += time.perf_counter() - start
+
+    reference = sum(c["reference"] for c in comparisons)
+    candidate = sum(c["candidate"] for c in comparisons)
+    matched = sum(c["matched"] for c in comparisons)
+    print(f"frames:          {gated.gate.frames}")
+    print(f"skipped:         {gated.gate.skip_fraction:.1%}")
+    print(f"recall vs full:  {matched / reference if reference else 1.0:.3f}")
+    print(f"precision:       {matched / candidate if candidate else 1.0:.3f}")
+    print(f"gated ms/frame:  {gated_time / max(1, gated.gate.frames) * 1000:.1f}")
+
+
+if __name__ == "__main__":
+    main()
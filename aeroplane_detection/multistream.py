@@ -0,0 +1,252 @@
+"""Many cameras in one process, sharing one batched model.
+
+Each source (camera index, RTSP URL or video file) gets a decode thread that
+feeds a LatestQueue, so a slow consumer drops stale camera frames instead of
+buffering them (video files are read at the consumer's pace instead, so
+recordings keep every frame), and a worker thread that runs that stream's infer / render /
+sink chain. Inference goes through a single BatchingInference, so frames
+arriving from different cameras at about the same time share one forward
+pass. Motion gates, trackers and renderers stay per stream.
+
+Windows can only be shown from the main thread, so DisplaySink hands the
+annotated frames over to it; VideoSink writes one file per stream instead.
+"""
+import re
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import cv2
+
+from pipeline import LatestQueue, StageStats, open_capture
+
+
+class Stream:
+    def __init__(
+        self,
+        name: str,
+        source: str,
+        infer: Callable[[Any], Any],
+        render: Optional[Callable[[Any, Any], Any]] = None,
+        sink: Optional[Callable[[str, Any], None]] = None,
+        queue_size: int = 1,
+        reconnect_delay: float = 2.0,
+        max_consecutive_errors: int = 30,
+    ):
+        """
+        Args:
+            name: Label for stats, windows and output files
+            source: Camera index, RTSP/HTTP URL or video file
+            infer: Called with a frame on this stream's worker thread, returns results
+            render: Called with (frame, results), returns the frame to hand to the sink
+            sink: Called with (name, rendered frame, source fps) for every processed frame
+            queue_size: Decoded frames held for the worker before older ones are dropped
+                (live sources) or decoding waits (files)
+            reconnect_delay: Seconds to wait before reopening a live source that stopped
+            max_consecutive_errors: Failed frames in a row before the stream is marked failed and stopped
+        """
+        self.name = name
+        self.source = source
+        self.infer = infer
+        self.render = render
+        self.sink = sink
+        self.reconnect_delay = reconnect_delay
+        self.max_consecutive_errors = max_consecutive_errors
+        # Files end for good; cameras and network streams are reopened
+        self.live = source.isdigit() or "://" in source
+
+        self.frames = LatestQueue(queue_size)
+        self.latency = StageStats()
+        self.captured = 0
+        self.processed = 0
+        self.reconnects = 0
+        self.errors = 0
+        self.failed = False
+        # Frame rate the source reports, 0 until it is opened or if it doesn't report one
+        self.source_fps = 0.0
+        self._processed_at = deque(maxlen=120)
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._decode_loop, name=f"decode-{name}", daemon=True),
+            threading.Thread(target=self._process_loop, name=f"process-{name}", daemon=True),
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.frames.close()
+
+    def join(self, timeout: Optional[float] = None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    @property
+    def finished(self) -> bool:
+        return not any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def fps(self) -> float:
+        times = list(self._processed_at)
+        return (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+
+    def _decode_loop(self):
+        while not self._stop.is_set():
+            cap = open_capture(self.source)
+            self.source_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            while not self._stop.is_set() and cap.isOpened():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                self.captured += 1
+                # A file has no real-time clock to keep up with, so wait for the worker rather
+                # than drop frames; VideoSink writes at the source fps and would otherwise speed up
+                self.frames.put((time.perf_counter(), frame), block=not self.live)
+            cap.release()
+            if not self.live or self._stop.wait(self.reconnect_delay):
+                break
+            self.reconnects += 1
+        self.frames.close()
+
+    def _process_loop(self):
+        consecutive_errors = 0
+        try:
+            while not self._stop.is_set():
+                item = self.frames.get(timeout=0.1)
+                if item is None:
+                    if self.frames.closed:
+                        break
+                    continue
+                captured_at, frame = item
+                try:
+                    results = self.infer(frame)
+                    if self.render is not None:
+                        frame = self.render(frame, results)
+                    if self.sink is not None:
+                        self.sink(self.name, frame, self.source_fps)
+                except Exception as e:
+                    # One bad frame shouldn't freeze the camera; a stream that keeps failing is given up
+                    self.errors += 1
+                    consecutive_errors += 1
+                    if consecutive_errors == 1:
+                        print(f"[{self.name}] frame failed: {e!r}")
+                    if consecutive_errors >= self.max_consecutive_errors:
+                        print(f"[{self.name}] stopping after {consecutive_errors} failed frames in a row")
+                        self.failed = True
+                        break
+                    continue
+                consecutive_errors = 0
+                now = time.perf_counter()
+                self.latency.add(now - captured_at)
+                self.processed += 1
+                self._processed_at.append(now)
+        finally:
+            # Also ends the decode loop, which stops once the queue is closed
+            self._stop.set()
+            self.frames.close()
+
+
+def format_stream_stats(streams, inference=None) -> str:
+    lines = []
+    for stream in streams:
+        (p50,) = stream.latency.percentiles(50)
+        lines.append(
+            f"[{stream.name}] {stream.fps:5.1f} fps | queue {len(stream.frames)} | dropped {stream.frames.dropped} "
+            f"| captured {stream.captured} processed {stream.processed} | e2e p50 {p50:.0f}ms"
+            + (f" | reconnects {stream.reconnects}" if stream.reconnects else "")
+            + (f" | errors {stream.errors}" if stream.errors else "")
+            + (" | FAILED" if stream.failed else "")
+        )
+    if inference is not None:
+        lines.append(f"inference: {inference.batches} batches, mean batch size {inference.mean_batch_size:.2f}")
+    return "\n".join(lines)
+
+
+class DisplaySink:
+    """Keeps the latest frame per stream for the main thread to show."""
+
+    def __init__(self):
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, name: str, frame, fps: float = 0.0):
+        with self._lock:
+            self._latest[name] = frame
+
+    def show(self) -> bool:
+        """Show pending frames; returns False once 'q' is pressed. Main thread only."""
+        with self._lock:
+            pending, self._latest = self._latest, {}
+        for name, frame in pending.items():
+            cv2.imshow(name, frame)
+        return cv2.waitKey(1) & 0xFF != ord("q")
+
+
+class VideoSink:
+    """Writes each stream to <output_dir>/<name>.mp4 at the stream's own frame rate."""
+
+    def __init__(self, output_dir: str, fps: float = 25.0):
+        """
+        Args:
+            output_dir: Directory for the video files, created if missing
+            fps: Frame rate for sources that don't report one
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.fps = fps
+        self._writers = {}
+
+    def __call__(self, name: str, frame, fps: float = 0.0):
+        # Only the stream's own worker thread writes to its writer
+        writer = self._writers.get(name)
+        if writer is None:
+            path = self.output_dir / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}.mp4"
+            height, width = frame.shape[:2]
+            writer = self._writers[name] = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"),
+                                                           fps or self.fps, (width, height))
+        writer.write(frame)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.release()
+        self._writers.clear()
+
+
+def run_streams(streams, display: Optional[DisplaySink] = None, stats_every: float = 5.0,
+                on_stats: Callable[[str], None] = print, inference=None):
+    """Run streams until every one has ended, 'q' is pressed or Ctrl+C.
+
+    Args:
+        streams: Stream objects, not yet started
+        display: Shown from this (the main) thread if given
+        stats_every: Seconds between per-stream reports
+        on_stats: Sink for the report text
+        inference: Shared BatchingInference, to include its batch sizes in the report
+    """
+    for stream in streams:
+        stream.start()
+    last_report = time.perf_counter()
+    try:
+        while not all(stream.finished for stream in streams):
+            if display is not None:
+                if not display.show():
+                    break
+            else:
+                time.sleep(0.05)
+            now = time.perf_counter()
+            if now - last_report >= stats_every:
+                on_stats(format_stream_stats(streams, inference))
+                last_report = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for stream in streams:
+            stream.stop()
+        for stream in streams:
+            stream.join(timeout=2.0)
+        on_stats(format_stream_stats(streams, inference))
@@ -0,0 +1,111 @@
+"""Lightweight in-place box/label overlay, replacing Results.plot().
+
+Results.plot() deep-copies the original frame, builds an Annotator around the
+copy and rasterises every label with putText on each call. OverlayRenderer
+draws straight into the frame it is given: boxes are plain cv2.rectangle
+calls, and each distinct label (class, score rounded to two places, or track
+ID) is rendered once into a small patch that later frames just copy in.
+
+Run as a script to compare it with Results.plot():
+    python overlay.py --image airport_241_jpg.rf.48233f88e0aba89db4dd06f40b5c3514.jpg
+"""
+import argparse
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from detections import Detections
+
+# Ultralytics' default palette, so overlays look the same as before
+PALETTE = [
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+    (10, 249, 72), (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0),
+    (168, 153, 44), (255, 194, 0), (147, 69, 52), (255, 115, 100), (236, 24, 0),
+    (255, 56, 132), (133, 0, 82), (255, 56, 203), (200, 149, 255), (199, 55, 255),
+]
+
+
+class OverlayRenderer:
+    def __init__(self, names=None, line_width: int = 2, font_scale: float = 0.5, cache_size: int = 1024):
+        self.names = names or {}
+        self.line_width = line_width
+        self.font_scale = font_scale
+        self.cache_size = cache_size
+        self._labels = OrderedDict()
+
+    def _label(self, text: str, color):
+        key = (text, color)
+        patch = self._labels.get(key)
+        if patch is not None:
+            self._labels.move_to_end(key)
+            return patch
+        (width, height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, 1)
+        patch = np.empty((height + baseline + 4, width + 4, 3), np.uint8)
+        patch[:] = color
+        text_color = (0, 0, 0) if sum(color) > 382 else (255, 255, 255)
+        cv2.putText(patch, text, (2, height + 2), cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, text_color, 1, cv2.LINE_AA)
+        self._labels[key] = patch
+        if len(self._labels) > self.cache_size:
+            self._labels.popitem(last=False)
+        return patch
+
+    def draw(self, frame: np.ndarray, detections: Detections, labels=None) -> np.ndarray:
+        """Draw detections into frame (modified in place) and return it.
+
+        Args:
+            frame: BGR image, must be writable
+            detections: Boxes in frame pixel coordinates
+            labels: Optional text per box; defaults to "<class name> <score>"
+        """
+        height, width = frame.shape[:2]
+        boxes = np.clip(detections.boxes, 0, [width - 1, height - 1, width - 1, height - 1]).astype(np.int32)
+        for i, (x1, y1, x2, y2) in enumerate(boxes):
+            cls = int(detections.classes[i])
+            color = PALETTE[cls % len(PALETTE)]
+            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color, self.line_width)
+
+            text = labels[i] if labels is not None else f"{self.names.get(cls, cls)} {detections.scores[i]:.2f}"
+            patch = self._label(text, color)
+            ph, pw = patch.shape[:2]
+            # Above the box if there is room, otherwise just inside it
+            top = y1 - ph if y1 >= ph else y1
+            pw, ph = min(pw, width - x1), min(ph, height - top)
+            frame[top:top + ph, x1:x1 + pw] = patch[:ph, :pw]
+        return frame
+
+
+def main():
+    from backends import add_backend_argument, load_model
+
+    parser = argparse.ArgumentParser(description="Compare OverlayRenderer with Results.plot()")
+    parser.add_argument("--image", default="airport_241_jpg.rf.48233f88e0aba89db4dd06f40b5c3514.jpg")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--conf", type=float, default=0.25)
+    add_backend_argument(parser)
+    args = parser.parse_args()
+
+    model = load_model("best.pt", args.backend)
+    result = model(args.image, conf=args.conf, verbose=False)[0]
+    detections = Detections.from_result(result)
+    renderer = OverlayRenderer(model.names)
+    frames = [result.orig_img.copy() for _ in range(args.repeat)]
+
+    def measure(name, fn):
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i in range(args.repeat):
+            fn(i)
+        elapsed = (time.perf_counter() - start) / args.repeat * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:16s} {elapsed:7.3f} ms/frame  peak alloc {peak / 1024:9.1f} KiB  ({len(detections)} boxes)")
+
+    measure("Results.plot()", lambda i: result.plot())
+    measure("OverlayRenderer", lambda i: renderer.draw(frames[i], detections))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Check exported backends against the PyTorch model on the test split.
+
+For every image in the split, each backend's detections are matched to the
+PyTorch detections (same class, IoU >= --iou) and per-image latency is timed.
+
+Usage:
+    python parity_check.py --backends onnx onnx-int8 openvino
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backends import BACKENDS, load_model
+from detections import Detections, compare
+
+DATASET = Path(__file__).parent / "Aerial Airport.v1-v1.yolov11"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare exported backends with best.pt")
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--backends", nargs="+", default=["onnx"], choices=BACKENDS[1:])
+    parser.add_argument("--split", default="test", choices=["train", "valid", "test"])
+    parser.add_argument("--conf", type=float, default=0.8)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU needed for two boxes to agree")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args()
+
+
+def run_backend(model, images, conf, imgsz, warmup):
+    for path in images[:warmup]:
+        model(str(path), conf=conf, imgsz=imgsz, verbose=False)
+    detections, latencies = [], []
+    for path in images:
+        start = time.perf_counter()
+        results = model(str(path), conf=conf, imgsz=imgsz, verbose=False)
+        latencies.append(time.perf_counter() - start)
+        detections.append(Detections.from_result(results[0]))
+    return detections, np.array(latencies) * 1000.0
+
+
+def summarize(name, latencies, comparisons=None):
+    row = {
+        "backend": name,
+        "latency_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+    }
+    if comparisons is not None:
+        reference = sum(c["reference"] for c in comparisons)
+        candidate = sum(c["candidate"] for c in comparisons)
+        matched = sum(c["matched"] for c in comparisons)
+        row.update({
+            "recall_vs_torch": round(matched / reference, 4) if reference else 1.0,
+            "precision_vs_torch": round(matched / candidate, 4) if candidate else 1.0,
+            "mean_iou": round(sum(c["iou_sum"] for c in comparisons) / matched, 4) if matched else None,
+            "max_score_delta": round(max((c["score_delta_max"] for c in comparisons), default=0.0), 4),
+        })
+    return row
+
+
+def main():
+    args = parse_args()
+    images = sorted((DATASET / args.split / "images").glob("*.jpg"))
+    if not images:
+        raise SystemExit(f"No images found under {DATASET / args.split / 'images'}")
+
+    reference, latencies = run_backend(load_model(args.weights), images, args.conf, args.imgsz, args.warmup)
+    report = [summarize("torch", latencies)]
+    for backend in args.backends:
+        model = load_model(args.weights, backend, args.imgsz)
+        detections, latencies = run_backend(model, images, args.conf, args.imgsz, args.warmup)
+        comparisons = [compare(ref, det, args.iou) for ref, det in zip(reference, detections)]
+        report.append(summarize(backend, latencies, comparisons))
+
+    print(f"{len(images)} images from the {args.split} split")
+    for row in report:
+        print(json.dumps(row))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Threaded capture -> inference -> render pipeline for live detection.
+
+Capture and inference each run on a worker thread; rendering stays on the
+caller's thread because cv2.imshow/waitKey must run on the main thread. The
+stages are joined by LatestQueue slots, so when YOLO falls behind the camera
+the stale frames are dropped instead of piling up as latency.
+"""
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+
+class LatestQueue:
+    """Bounded queue where new items push out the oldest unread ones.
+
+    put(block=True) waits for room instead, for producers (video files) that
+    must not lose frames.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item, block: bool = False):
+        with self._cond:
+            if block:
+                self._cond.wait_for(lambda: len(self._items) < self._items.maxlen or self._closed)
+                if self._closed:
+                    return
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            # Producers waiting for room and consumers share the condition
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None):
+        """Return the oldest retained item, or None on timeout / after close."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed and not self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+class StageStats:
+    """Rolling latency window for one pipeline stage."""
+
+    def __init__(self, window: int = 300):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def percentiles(self, *qs):
+        with self._lock:
+            samples = np.array(self._samples)
+        if samples.size == 0:
+            return [float("nan")] * len(qs)
+        return list(np.percentile(samples, qs) * 1000.0)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MiB (nan if it can't be read)."""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux but bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return float("nan")
+
+
+def open_capture(source: str, width: int = 640, height: int = 480):
+    """Open a camera index, stream URL or video file."""
+    import cv2
+
+    cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    cap.set(3, width)  # Width
+    cap.set(4, height)  # Height
+    return cap
+
+
+@dataclass
+class Packet:
+    index: int
+    captured_at: float
+    image: Any
+    results: Any = None
+    extras: dict = field(default_factory=dict)
+
+
+def format_stats(stats: dict, elapsed: float, rendered: int, *queues: LatestQueue) -> str:
+    parts = []
+    for name, stage in stats.items():
+        p50, p95 = stage.percentiles(50, 95)
+        parts.append(f"{name} p50 {p50:.1f}ms p95 {p95:.1f}ms")
+    fps = rendered / elapsed if elapsed > 0 else 0.0
+    dropped = "/".join(str(q.dropped) for q in queues)
+    return " | ".join(parts) + f" | {fps:.1f} fps | dropped {dropped}"
+
+
+def run_pipelined(
+    cap,
+    infer: Callable[[Any], Any],
+    render: Callable[[Packet], Any],
+    window: str = "res",
+    stats_every: float = 5.0,
+    on_stats: Callable[[str], None] = print,
+):
+    """Run capture, inference and render as a pipeline until 'q' or end of stream.
+
+    Args:
+        cap: Opened cv2.VideoCapture (or anything with read()/isOpened())
+        infer: Called with a frame, returns detection results
+        render: Called with a Packet holding image and results, returns the frame to show
+        window: Name of the OpenCV display window
+        stats_every: Seconds between latency reports
+        on_stats: Sink for the latency report lines
+    """
+    frames = LatestQueue()
+    detected = LatestQueue()
+    stop = threading.Event()
+    stats = {name: StageStats() for name in ("capture", "inference", "render", "end-to-end")}
+
+    def capture_loop():
+        index = 0
+        while not stop.is_set() and cap.isOpened():
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                break  # Exit if the frame is not captured
+            now = time.perf_counter()
+            stats["capture"].add(now - start)
+            frames.put(Packet(index, now, frame))
+            index += 1
+        frames.close()
+
+    errors = []
+
+    def inference_loop():
+        try:
+            while not stop.is_set():
+                packet = frames.get(timeout=0.1)
+                if packet is None:
+                    if frames.closed:
+                        break
+                    continue
+                start = time.perf_counter()
+                packet.results = infer(packet.image)
+                stats["inference"].add(time.perf_counter() - start)
+                detected.put(packet)
+        except Exception as e:
+            # Handed to the main thread, which re-raises once the render loop stops
+            errors.append(e)
+        finally:
+            detected.close()
+
+    workers = [
+        threading.Thread(target=capture_loop, name="capture", daemon=True),
+        threading.Thread(target=inference_loop, name="inference", daemon=True),
+    ]
+    for worker in workers:
+        worker.start()
+
+    import cv2
+
+    started = last_report = time.perf_counter()
+    rendered = 0
+    try:
+        while True:
+            packet = detected.get(timeout=0.01)
+            if packet is None:
+                if detected.closed:
+                    break
+            else:
+                start = time.perf_counter()
+                cv2.imshow(window, render(packet))
+                now = time.perf_counter()
+                stats["render"].add(now - start)
+                stats["end-to-end"].add(now - packet.captured_at)
+                rendered += 1
+
+            # Press 'q' to exit
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                break
+
+            now = time.perf_counter()
+            if now - last_report >= stats_every:
+                on_stats(format_stats(stats, now - started, rendered, frames, detected))
+                last_report = now
+    finally:
+        stop.set()
+        frames.close()
+        for worker in workers:
+            worker.join(timeout=1.0)
+        on_stats(format_stats(stats, time.perf_counter() - started, rendered, frames, detected))
+    if errors:
+        raise RuntimeError("inference failed") from errors[0]
+    return stats
@@ -1,10 +1,68 @@
-from ultralytics import YOLO
+import argparse
+from pathlib import Path
+
+from backends import add_backend_argument, load_model
+from detection_cache import add_cache_arguments
+
+parser = argparse.ArgumentParser(description="Run aeroplane detection on an image")
+parser.add_argument("source", nargs="?", default="airport_241_jpg.rf.48233f88e0aba89db4dd06f40b5c3514.jpg",
+                    help="image, directory or video to run on")
+parser.add_argument("--no-show", action="store_true", help="don't open a window with the results")
+parser.add_argument("--sliced", action="store_true",
+                    help="tile large images with overlap and merge boxes (better recall on small planes)")
+parser.add_argument("--conf", type=float, default=0.25, help="confidence threshold")
+parser.add_argument("--imgsz", type=int, default=640, help="model input size (also the tile size)")
+add_backend_argument(parser)
+add_cache_arguments(parser)
+args = parser.parse_args()
 
 # Load a model
-model = YOLO("best.pt")
-results = model(r"D:\acm\models\dl230225\airport_241_jpg.rf.48233f88e0aba89db4dd06f40b5c3514.jpg", save=True, show=True)  # Replace with an actual test image path
+model = load_model("best.pt", args.backend, args.imgsz)
+
+if args.sliced or args.cache:
+    import cv2
+
+    from detection_cache import hash_file, open_cache
+    from detections import Detections, draw_detections
+    from tiling import sliced_predict
+
+    source = Path(args.source)
+    paths = sorted(p for p in source.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png")) \
+        if source.is_dir() else [source]
+    save_dir = Path("runs/detect/sliced" if args.sliced else "runs/detect/cached")
+    save_dir.mkdir(parents=True, exist_ok=True)
+    cache = open_cache(args, sliced=args.sliced)
+
+    for path in paths:
+        image = cv2.imread(str(path))
+        key = hash_file(path) if cache else None
+        entry = cache.get(key) if cache else None
+        if entry is not None:
+            detections = entry.detections
+        elif args.sliced:
+            detections = sliced_predict(model, image, conf=args.conf, imgsz=args.imgsz)
+        else:
+            detections = Detections.from_result(model(image, conf=args.conf, imgsz=args.imgsz, verbose=False)[0])
+        if cache and entry is None:
+            cache.put(key, detections, *image.shape[:2])
+
+        # Print the detection results
+        print(f"{path}: {len(detections)} detections{' (cached)' if entry is not None else ''}")
+        for box, score, cls in zip(detections.boxes, detections.scores, detections.classes):
+            print(f"  {model.names[int(cls)]} {score:.2f} {box.round(1).tolist()}")
+
+        annotated = draw_detections(image, detections, model.names)
+        cv2.imwrite(str(save_dir / path.name), annotated)
+        if not args.no_show:
+            cv2.imshow("res", annotated)
+            cv2.waitKey(0)
 
-# Print the detection results
-for result in results:
-    print(result)
+    if cache:
+        print(f"Detection cache: {cache.hits} hits, {cache.misses} misses ({cache.hit_rate:.0%})")
+        cache.close()
+else:
+    results = model(args.source, conf=args.conf, imgsz=args.imgsz, save=True, show=not args.no_show)
 
+    # Print the detection results
+    for result in results:
+        print(result)
@@ -0,0 +1,108 @@
+"""Sliced (SAHI-style) inference for large aerial images.
+
+A large image is cut into overlapping tiles at the model's native input
+size, so small aircraft are not shrunk away by the global resize. Tiles are
+run through the model in batches, boxes are shifted back into image
+coordinates and merged with cross-tile NMS. An optional full-image pass
+keeps large aircraft that do not fit inside one tile.
+"""
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+from detections import Detections, nms
+
+# Input pixels per forward pass the batch size is derived from (8 tiles at
+# imgsz=640). Every tile is letterboxed to imgsz, so that is what each one costs
+BATCH_PIXEL_BUDGET = 8 * 640 * 640
+
+
+def plan_tiles(height: int, width: int, tile: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+    """Return (x1, y1, x2, y2) windows covering the image with the given overlap."""
+
+    def starts(length):
+        if length <= tile:
+            return [0]
+        count = math.ceil((length - tile) / (tile * (1 - overlap))) + 1
+        step = (length - tile) / (count - 1)
+        return [round(i * step) for i in range(count)]
+
+    return [
+        (x, y, min(x + tile, width), min(y + tile, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def choose_tiling(height: int, width: int, imgsz: int = 640, overlap: float = 0.2, max_tiles: int = 16):
+    """Pick tile size and batch size for an image.
+
+    Tiles start at the model input size; for very large images the tile grows
+    (and the model downsamples it) until the tile count fits max_tiles, so
+    inference time stays bounded.
+
+    Returns:
+        (tile, windows, batch) or (None, [], 1) when the image is small enough
+        to run whole
+    """
+    if max(height, width) <= imgsz * 1.25:
+        return None, [], 1
+    tile = imgsz
+    windows = plan_tiles(height, width, tile, overlap)
+    while len(windows) > max_tiles:
+        tile = int(tile * 1.25)
+        windows = plan_tiles(height, width, tile, overlap)
+    batch = max(1, min(len(windows), BATCH_PIXEL_BUDGET // (imgsz * imgsz)))
+    return tile, windows, batch
+
+
+def sliced_predict(
+    model,
+    image: np.ndarray,
+    conf: float = 0.25,
+    imgsz: int = 640,
+    overlap: float = 0.2,
+    max_tiles: int = 16,
+    full_pass: bool = True,
+    merge_threshold: float = 0.5,
+) -> Detections:
+    """Detect on an image tile by tile and merge the results.
+
+    Args:
+        model: Loaded YOLO model
+        image: BGR image array
+        conf: Confidence threshold
+        imgsz: Model input size, also the base tile size
+        overlap: Fraction of a tile shared with its neighbour
+        max_tiles: Upper bound on tiles per image
+        full_pass: Also run the whole image once, for aircraft larger than a tile
+        merge_threshold: Intersection-over-smaller above which boxes are merged
+
+    Returns:
+        Detections in full-image pixel coordinates
+    """
+    height, width = image.shape[:2]
+    tile, windows, batch = choose_tiling(height, width, imgsz, overlap, max_tiles)
+
+    parts = []
+    if tile is None or full_pass:
+        parts.append(Detections.from_result(model(image, conf=conf, imgsz=imgsz, verbose=False)[0]))
+
+    for start in range(0, len(windows), batch):
+        chunk = windows[start:start + batch]
+        # Slices are views, the model's letterbox makes the only copy
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in chunk]
+        for (x1, y1, _, _), result in zip(chunk, model(crops, conf=conf, imgsz=imgsz, verbose=False)):
+            detections = Detections.from_result(result)
+            detections.boxes += np.array([x1, y1, x1, y1], np.float32)
+            parts.append(detections)
+
+    if len(parts) == 1:
+        return parts[0]
+    merged = Detections(
+        np.concatenate([p.boxes for p in parts]),
+        np.concatenate([p.scores for p in parts]),
+        np.concatenate([p.classes for p in parts]),
+    )
+    return nms(merged, merge_threshold, metric="ios")
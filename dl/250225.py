@@ -1,14 +1,14 @@
+import argparse
+
 from ultralytics import YOLO
 
-# Initialize the model with a pretrained weight file
-model = YOLO("yolov8n.pt")
+from tune_driver import tune
 
-# Tune the model by passing valid keyword arguments.
+# Tuning arguments, passed either to model.tune() or to the parallel driver.
 # Note: Only pass arguments that are recognized by the YOLO CLI.
-model.tune(
+TUNE_ARGS = dict(
     data="coco8.yaml",   # path to your dataset config file
     epochs=30,           # total training epochs
-    iterations=90,      # number of iterations for tuning
     imgsz=640,           # image size for training
     optimizer="auto",    # choose the optimizer ("auto", "AdamW", "SGD", etc.)
     cos_lr=False,        # whether to use a cosine learning rate schedule
@@ -57,3 +57,27 @@ model.tune(
     fraction=1.0,        # fraction of the dataset to use
     freeze=None          # number of layers to freeze
 )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune yolov8n hyperparameters")
+    parser.add_argument("--iterations", type=int, default=90, help="number of iterations for tuning")
+    parser.add_argument("--workers", type=int, default=2, help="trials trained in parallel")
+    parser.add_argument("--store", default="tune.sqlite", help="trial database, reused to resume")
+    parser.add_argument("--sequential", action="store_true", help="use ultralytics' built-in model.tune()")
+    parser.add_argument("--shards", action="store_true",
+                        help="pack the dataset into memory-mapped shards once and train every trial from them")
+    args = parser.parse_args()
+
+    if args.sequential:
+        # Initialize the model with a pretrained weight file
+        model = YOLO("yolov8n.pt")
+        model.tune(iterations=args.iterations, **TUNE_ARGS)
+    else:
+        trainer = None
+        if args.shards:
+            from shard_cache import ShardTrainer, ensure_shards
+
+            ensure_shards(TUNE_ARGS["data"], TUNE_ARGS["imgsz"])
+            trainer = ShardTrainer
+        tune("yolov8n.pt", TUNE_ARGS, iterations=args.iterations, workers=args.workers, store=args.store,
+             trainer=trainer)
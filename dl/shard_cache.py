@@ -0,0 +1,239 @@
+"""Pre-decoded, memory-mapped image shards for YOLO training and tuning.
+
+Every epoch of every trial otherwise re-reads, decodes and resizes the same
+JPEGs. pack() does that once per split and imgsz: images are resized exactly
+as YOLODataset.load_image() would (long side to imgsz) and written back to
+back into one uint8 file, next to an index holding each image's offset,
+shapes, source mtime and labels.
+
+ShardTrainer is a DetectionTrainer whose datasets map that file and hand out
+views into it instead of decoding, so the data loader only does augmentation.
+The mapping is copy-on-write: augmentations that work in place touch private
+pages, never the shard. Images that are missing from the shard or changed
+since it was packed are decoded as usual.
+
+Shards live next to each split's image directory, e.g. train/images.shard640/.
+
+Written against ultralytics 8.2.103 (see requirements.txt): the dataset and
+trainer hooks used here are not in the 8.0.x releases.
+
+Usage:
+    python shard_cache.py --data data.yaml --imgsz 640
+    yolo.train(data="data.yaml", imgsz=640, trainer=ShardTrainer)
+"""
+import argparse
+import json
+import os
+import shutil
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+
+import numpy as np
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import LOGGER
+
+SHARD_VERSION = 1
+
+
+def shard_dir(img_path, imgsz: int) -> Path:
+    """Where the shard for a split's image directory (or list file) is kept."""
+    path = Path(img_path)
+    return path.with_name(f"{path.name}.shard{imgsz}")
+
+
+def pack(img_path, imgsz: int, data: dict, workers: int = 8) -> Path:
+    """Decode, resize and write every image of a split into its shard; return the shard directory."""
+    from ultralytics.cfg import get_cfg
+
+    dataset = YOLODataset(img_path=img_path, imgsz=imgsz, augment=False, hyp=get_cfg(), cache=None,
+                          data=data, task="detect", prefix=f"shard {Path(img_path).name}: ")
+    target = shard_dir(img_path, imgsz)
+    tmp = target.with_name(target.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    n = len(dataset.im_files)
+    offsets = np.zeros(n + 1, np.int64)
+    shapes = np.zeros((n, 3), np.int32)
+    hw0 = np.zeros((n, 2), np.int32)
+    # Decoding releases the GIL, so threads keep the writer busy
+    with open(tmp / "images.u8", "wb") as f, ThreadPool(workers) as pool:
+        for i, (im, (h0, w0), _) in enumerate(pool.imap(dataset.load_image, range(n))):
+            im = np.ascontiguousarray(im, dtype=np.uint8)
+            f.write(im.data)
+            offsets[i + 1] = offsets[i] + im.nbytes
+            shapes[i] = im.shape if im.ndim == 3 else (*im.shape, 1)
+            hw0[i] = h0, w0
+
+    labels = dataset.labels
+    label_offsets = np.cumsum([0] + [len(lb["cls"]) for lb in labels])
+    np.savez(
+        tmp / "index.npz",
+        im_files=np.array(dataset.im_files),
+        mtimes=np.array([os.path.getmtime(f) for f in dataset.im_files]),
+        offsets=offsets,
+        shapes=shapes,
+        hw0=hw0,
+        label_offsets=label_offsets,
+        cls=np.concatenate([lb["cls"].reshape(-1, 1) for lb in labels]).astype(np.float32),
+        bboxes=np.concatenate([lb["bboxes"].reshape(-1, 4) for lb in labels]).astype(np.float32),
+    )
+    (tmp / "meta.json").write_text(json.dumps({"version": SHARD_VERSION, "imgsz": imgsz, "images": n,
+                                               "bytes": int(offsets[-1])}))
+    shutil.rmtree(target, ignore_errors=True)
+    tmp.rename(target)
+    LOGGER.info(f"Packed {n} images ({offsets[-1] / 2**20:.1f} MiB) into {target}")
+    return target
+
+
+def ensure_shards(data: str, imgsz: int, splits=("train", "val")):
+    """Pack the splits of a data yaml that don't have a shard for imgsz yet."""
+    from ultralytics.data.utils import check_det_dataset
+
+    info = check_det_dataset(data)
+    for split in splits:
+        img_path = info.get(split)
+        if not isinstance(img_path, str):
+            LOGGER.warning(f"Skipping shard for '{split}': only a single image directory or list file is supported")
+            continue
+        if ShardReader.open(shard_dir(img_path, imgsz), imgsz) is None:
+            pack(img_path, imgsz, info)
+
+
+class ShardReader:
+    """Index plus lazily mapped image file of one shard; cheap to pickle into loader workers."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        index = np.load(self.root / "index.npz")
+        self.offsets = index["offsets"]
+        self.shapes = index["shapes"]
+        self.hw0 = index["hw0"]
+        self.label_offsets = index["label_offsets"]
+        self.cls = index["cls"]
+        self.bboxes = index["bboxes"]
+        self.slots = {}
+        for slot, (file, mtime) in enumerate(zip(index["im_files"].tolist(), index["mtimes"])):
+            # Images changed since packing fall back to decoding
+            if os.path.exists(file) and os.path.getmtime(file) == mtime:
+                self.slots[file] = slot
+        self._buffer = None
+
+    @classmethod
+    def open(cls, root: Path, imgsz: int):
+        """Reader for root, or None if it is missing or was packed for another imgsz / format."""
+        try:
+            meta = json.loads((Path(root) / "meta.json").read_text())
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != SHARD_VERSION or meta.get("imgsz") != imgsz:
+            return None
+        return cls(root)
+
+    def __getstate__(self):
+        # Each worker maps the file itself instead of receiving a pickled copy of it
+        state = self.__dict__.copy()
+        state["_buffer"] = None
+        return state
+
+    def image(self, slot: int) -> np.ndarray:
+        if self._buffer is None:
+            self._buffer = np.memmap(self.root / "images.u8", dtype=np.uint8, mode="c")
+        h, w, c = self.shapes[slot]
+        im = self._buffer[self.offsets[slot]:self.offsets[slot + 1]].reshape(h, w, c)
+        return im if c > 1 else im[..., 0]
+
+    def label(self, slot: int, im_file: str) -> dict:
+        start, end = self.label_offsets[slot], self.label_offsets[slot + 1]
+        return {
+            "im_file": im_file,
+            "shape": tuple(int(v) for v in self.hw0[slot]),
+            "cls": self.cls[start:end].copy(),
+            "bboxes": self.bboxes[start:end].copy(),
+            "segments": [],
+            "keypoints": None,
+            "normalized": True,
+            "bbox_format": "xywh",
+        }
+
+
+class ShardDataset(YOLODataset):
+    """YOLODataset that serves images and labels from a ShardReader where it can."""
+
+    def __init__(self, *args, shard: ShardReader, **kwargs):
+        self.shard = shard
+        super().__init__(*args, **kwargs)
+
+    def get_labels(self):
+        slots = [self.shard.slots.get(f) for f in self.im_files]
+        if None in slots:
+            LOGGER.warning(f"{self.prefix}{slots.count(None)} images not in {self.shard.root}, reading labels from disk")
+            return super().get_labels()
+        return [self.shard.label(slot, f) for slot, f in zip(slots, self.im_files)]
+
+    def load_image(self, i, rect_mode=True, *args, **kwargs):
+        slot = self.shard.slots.get(self.im_files[i])
+        if slot is None or not rect_mode or args or kwargs.get("resize_short") or self.ims[i] is not None:
+            return super().load_image(i, rect_mode, *args, **kwargs)
+
+        im = self.shard.image(slot)
+        h0, w0 = (int(v) for v in self.shard.hw0[slot])
+        # Mosaic picks its extra images from the buffer, so keep it filled as the base class does
+        if self.augment:
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, (h0, w0), im.shape[:2]
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+        return im, (h0, w0), im.shape[:2]
+
+
+class ShardTrainer(DetectionTrainer):
+    """DetectionTrainer reading packed shards; splits without one are loaded normally."""
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        shard = ShardReader.open(shard_dir(img_path, self.args.imgsz), self.args.imgsz) \
+            if isinstance(img_path, str) else None
+        if shard is None:
+            LOGGER.warning(f"No shard for {img_path} at imgsz={self.args.imgsz}, decoding images from disk")
+            return super().build_dataset(img_path, mode, batch)
+
+        model = getattr(self.model, "module", self.model)
+        stride = max(int(model.stride.max() if model else 0), 32)
+        return ShardDataset(
+            img_path=img_path,
+            imgsz=self.args.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=self.args,
+            rect=self.args.rect or mode == "val",
+            cache=None,  # the shard already is the cache
+            single_cls=self.args.single_cls or False,
+            stride=stride,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=f"{mode}: ",
+            task=self.args.task,
+            classes=self.args.classes,
+            data=self.data,
+            fraction=self.args.fraction if mode == "train" else 1.0,
+            shard=shard,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a YOLO dataset into memory-mapped shards")
+    parser.add_argument("--data", default="coco8.yaml")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--splits", nargs="+", default=["train", "val"])
+    parser.add_argument("--force", action="store_true", help="repack splits that already have a shard")
+    args = parser.parse_args()
+    if args.force:
+        from ultralytics.data.utils import check_det_dataset
+
+        info = check_det_dataset(args.data)
+        for split in args.splits:
+            if isinstance(info.get(split), str):
+                pack(info[split], args.imgsz, info)
+    else:
+        ensure_shards(args.data, args.imgsz, args.splits)
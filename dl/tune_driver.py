@@ -0,0 +1,295 @@
+"""Parallel, resumable hyperparameter search for YOLO training.
+
+A drop-in alternative to model.tune(): trials run concurrently in a process
+pool and every trial's config, per-epoch fitness and final fitness are kept
+in a SQLite file. Re-running with the same --store resumes the search: completed
+and pruned trials count towards --iterations, and trials interrupted by a
+crash are run again. Trials whose training raised are not retried; their
+slots go to new configs.
+
+New trials mutate one of the best configs found so far (the same scheme as
+ultralytics' Tuner). A trial is pruned once its fitness at an epoch falls
+below the median of the other trials at that epoch.
+
+Usage:
+    python tune_driver.py --data coco8.yaml --epochs 30 --iterations 90 --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+# (min, max) for each tuned hyperparameter, as in ultralytics' Tuner
+SEARCH_SPACE = {
+    "lr0": (1e-5, 1e-1),
+    "lrf": (0.0001, 0.1),
+    "momentum": (0.7, 0.98),
+    "weight_decay": (0.0, 0.001),
+    "warmup_epochs": (0.0, 5.0),
+    "warmup_momentum": (0.0, 0.95),
+    "box": (1.0, 20.0),
+    "cls": (0.2, 4.0),
+    "dfl": (0.4, 6.0),
+    "hsv_h": (0.0, 0.1),
+    "hsv_s": (0.0, 0.9),
+    "hsv_v": (0.0, 0.9),
+    "degrees": (0.0, 45.0),
+    "translate": (0.0, 0.9),
+    "scale": (0.0, 0.95),
+    "shear": (0.0, 10.0),
+    "perspective": (0.0, 0.001),
+    "flipud": (0.0, 1.0),
+    "fliplr": (0.0, 1.0),
+    "mosaic": (0.0, 1.0),
+    "mixup": (0.0, 1.0),
+    "copy_paste": (0.0, 1.0),
+}
+
+# ultralytics' defaults for the tuned hyperparameters; the starting point for
+# any of them base_args leaves out, so there is always something to mutate
+DEFAULT_HYPERPARAMETERS = {
+    "lr0": 0.01,
+    "lrf": 0.01,
+    "momentum": 0.937,
+    "weight_decay": 0.0005,
+    "warmup_epochs": 3.0,
+    "warmup_momentum": 0.8,
+    "box": 7.5,
+    "cls": 0.5,
+    "dfl": 1.5,
+    "hsv_h": 0.015,
+    "hsv_s": 0.7,
+    "hsv_v": 0.4,
+    "degrees": 0.0,
+    "translate": 0.1,
+    "scale": 0.5,
+    "shear": 0.0,
+    "perspective": 0.0,
+    "flipud": 0.0,
+    "fliplr": 0.5,
+    "mosaic": 1.0,
+    "mixup": 0.0,
+    "copy_paste": 0.0,
+}
+
+
+class TrialStore:
+    """SQLite record of trials; shared by the driver and every worker process."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS trials (
+                    id INTEGER PRIMARY KEY,
+                    config TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    fitness REAL,
+                    epochs INTEGER DEFAULT 0,
+                    started REAL,
+                    finished REAL
+                );
+                CREATE TABLE IF NOT EXISTS epochs (
+                    trial_id INTEGER,
+                    epoch INTEGER,
+                    fitness REAL,
+                    PRIMARY KEY (trial_id, epoch)
+                );
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=60)
+
+    def add(self, config: dict) -> int:
+        with self._connect() as db:
+            return db.execute(
+                "INSERT INTO trials (config, status) VALUES (?, 'queued')", (json.dumps(config),)
+            ).lastrowid
+
+    def set_status(self, trial_id: int, status: str, fitness=None):
+        column = "started" if status == "running" else "finished"
+        with self._connect() as db:
+            db.execute(
+                f"UPDATE trials SET status = ?, fitness = COALESCE(?, fitness), {column} = ? WHERE id = ?",
+                (status, fitness, time.time(), trial_id),
+            )
+
+    def record_epoch(self, trial_id: int, epoch: int, fitness: float):
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO epochs VALUES (?, ?, ?)", (trial_id, epoch, fitness))
+            db.execute("UPDATE trials SET epochs = ? WHERE id = ?", (epoch + 1, trial_id))
+
+    def fitness_at(self, epoch: int, exclude: int):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT fitness FROM epochs WHERE epoch = ? AND trial_id != ? AND fitness IS NOT NULL",
+                (epoch, exclude),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def trials(self, *statuses):
+        query = "SELECT id, config, status, fitness FROM trials"
+        if statuses:
+            query += f" WHERE status IN ({','.join('?' * len(statuses))})"
+        with self._connect() as db:
+            return [(i, json.loads(c), s, f) for i, c, s, f in db.execute(query, statuses).fetchall()]
+
+
+def mutate(parents, rng: random.Random, sigma: float = 0.2, probability: float = 0.8) -> dict:
+    """New config from a fitness-weighted pick among the best (config, fitness) pairs."""
+    fitness = [max(f, 1e-6) for _, f in parents]
+    config = dict(rng.choices([c for c, _ in parents], weights=fitness)[0])
+    if not any(name in config for name in SEARCH_SPACE):
+        return config
+    changed = False
+    while not changed:
+        for name, (low, high) in SEARCH_SPACE.items():
+            if name in config and rng.random() < probability:
+                value = config[name]
+                if value <= low:
+                    # Scaling can't move a value off zero; step into the bottom of the range instead
+                    new = rng.uniform(low, low + sigma * (high - low))
+                else:
+                    new = value * min(max(rng.gauss(1.0, sigma), 0.3), 3.0)
+                new = round(min(max(new, low), high), 5)
+                # Clipping or rounding can leave a value where it was
+                if new != value:
+                    config[name] = new
+                    changed = True
+    return config
+
+
+def run_trial(store_path, trial_id, model, config, prune_after, prune_min_trials, trainer=None):
+    """Train one config in a worker process and return its best fitness."""
+    from ultralytics import YOLO
+
+    store = TrialStore(store_path)
+    store.set_status(trial_id, "running")
+    pruned = False
+
+    def on_fit_epoch_end(trainer):
+        nonlocal pruned
+        fitness = trainer.fitness
+        if fitness is None:
+            return
+        fitness = float(fitness)
+        store.record_epoch(trial_id, trainer.epoch, fitness)
+        if trainer.epoch + 1 < prune_after:
+            return
+        others = sorted(store.fitness_at(trainer.epoch, exclude=trial_id))
+        if len(others) >= prune_min_trials and fitness < others[len(others) // 2]:
+            pruned = True
+            trainer.stop = True
+
+    yolo = YOLO(model)
+    yolo.add_callback("on_fit_epoch_end", on_fit_epoch_end)
+    try:
+        extra = {"trainer": trainer} if trainer is not None else {}
+        yolo.train(**config, project="runs/tune", name=f"trial_{trial_id}", exist_ok=True, plots=False, **extra)
+    except Exception:
+        store.set_status(trial_id, "failed")
+        raise
+    best = float(yolo.trainer.best_fitness or 0.0)
+    store.set_status(trial_id, "pruned" if pruned else "complete", best)
+    return trial_id, best, pruned
+
+
+def tune(model, base_args, iterations=90, workers=2, store="tune.sqlite", prune_after=5,
+         prune_min_trials=4, seed=0, trainer=None):
+    """Run (or resume) a search of `iterations` trials with `workers` in parallel.
+
+    Args:
+        model: Weights or model yaml each trial starts from
+        base_args: Training arguments; SEARCH_SPACE keys missing from it start at
+            DEFAULT_HYPERPARAMETERS, and all of them are tuned
+        iterations: Total number of trials, including ones from earlier runs
+        workers: Trials trained concurrently
+        store: SQLite file holding trial configs and results
+        prune_after: Epochs a trial always gets before it can be pruned
+        prune_min_trials: Other trials needed at an epoch before pruning against them
+        seed: Seed for the mutation RNG
+        trainer: Optional trainer class passed through to model.train()
+
+    Returns:
+        (config, fitness) of the best finished trial
+    """
+    store = TrialStore(store)
+    rng = random.Random(seed + len(store.trials()))
+    base_args = {**DEFAULT_HYPERPARAMETERS, **base_args}
+    # Only the first trial of a fresh search trains base_args unchanged
+    seeded = bool(store.trials())
+
+    # Trials left running or queued by an interrupted run get another go. Failed ones
+    # don't: a config that makes training raise would otherwise be retried on every resume
+    pending = [(i, c) for i, c, _, _ in store.trials("running", "queued")]
+    finished = lambda: [(c, f) for _, c, _, f in store.trials("complete", "pruned") if f is not None]
+    done = len(store.trials("complete", "pruned"))
+
+    def next_config():
+        nonlocal seeded
+        if pending:
+            return pending.pop(0)
+        results = sorted(finished(), key=lambda cf: cf[1], reverse=True)[:5]
+        if results:
+            config = mutate(results, rng)
+        elif not seeded:
+            seeded = True
+            config = dict(base_args)
+        else:
+            # Nothing has finished yet: the other initial slots explore around the base
+            config = mutate([(base_args, 1.0)], rng)
+        return store.add(config), config
+
+    # Split CPU threads between concurrent trials
+    os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        running = {}
+        while done < iterations or running:
+            while done + len(running) < iterations and len(running) < workers:
+                trial_id, config = next_config()
+                future = pool.submit(run_trial, store.path, trial_id, model, config,
+                                     prune_after, prune_min_trials, trainer)
+                running[future] = trial_id
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                trial_id = running.pop(future)
+                try:
+                    _, fitness, pruned = future.result()
+                    done += 1
+                    print(f"trial {trial_id}: fitness {fitness:.5f}{' (pruned)' if pruned else ''} "
+                          f"[{done}/{iterations}]")
+                except Exception as e:
+                    # Counted towards this run; a resumed run replaces it with a new config
+                    done += 1
+                    print(f"trial {trial_id} failed: {e}")
+
+    best = max(finished(), key=lambda cf: cf[1], default=(None, None))
+    print(f"best fitness {best[1]} with {json.dumps(best[0])}")
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel, resumable YOLO hyperparameter tuning")
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--data", default="coco8.yaml")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--iterations", type=int, default=90)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--store", default="tune.sqlite")
+    parser.add_argument("--prune-after", type=int, default=5)
+    parser.add_argument("--shards", action="store_true", help="train from memory-mapped shards (see shard_cache.py)")
+    args = parser.parse_args()
+    trainer = None
+    if args.shards:
+        from shard_cache import ShardTrainer, ensure_shards
+
+        ensure_shards(args.data, args.imgsz)
+        trainer = ShardTrainer
+    tune(args.model, {"data": args.data, "epochs": args.epochs, "imgsz": args.imgsz},
+         args.iterations, args.workers, args.store, args.prune_after, trainer=trainer)
@@ -1,18 +1,73 @@
 # backend/clients/gemini_client.py
 import os
+import asyncio
+import random
+import importlib.util
+import json
 import httpx
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, List, Optional
 from fastapi import HTTPException
 
+# batchEmbedContents accepts at most 100 texts per call; the character budget
+# keeps request bodies small when the texts are long
+EMBED_BATCH_SIZE = 100
+EMBED_BATCH_CHARS = 200_000
+# Longer texts are cut to stay within the embedding model's input limit
+EMBED_MAX_TEXT_CHARS = 8000
+
+def chunk_texts(
+    texts: List[str],
+    max_items: int = EMBED_BATCH_SIZE,
+    max_chars: int = EMBED_BATCH_CHARS
+) -> List[List[int]]:
+    """Split texts into batches for a batch embedding call
+    
+    Args:
+        texts: Texts to embed
+        max_items: Most texts in one batch
+        max_chars: Most characters in one batch (a single longer text gets its own batch)
+        
+    Returns:
+        Batches as lists of indices into texts, in order
+    """
+    batches, current, size = [], [], 0
+    for i, text in enumerate(texts):
+        length = min(len(text or ""), EMBED_MAX_TEXT_CHARS)
+        if current and (len(current) >= max_items or size + length > max_chars):
+            batches.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += length
+    if current:
+        batches.append(current)
+    return batches
+
 class GeminiClient:
-    """Client for interacting with the Gemini API"""
+    """Client for interacting with the Gemini API.
+
+    Holds one pooled httpx.AsyncClient (keep-alive, HTTP/2 when the h2 package
+    is installed) for its whole lifetime, so calls reuse open connections
+    instead of paying a TCP+TLS handshake each time. Create it once at app
+    startup and call aclose() on shutdown.
+    """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+    ):
         """
         Initialize the Gemini API client.
         
         Args:
             api_key: Gemini API key, defaults to GEMINI_API_KEY env variable
+            max_connections: Upper bound on concurrent connections to the API
+            max_keepalive_connections: Idle connections kept open for reuse
+            keepalive_expiry: Seconds an idle connection is kept before closing
+            http2: Multiplex requests over HTTP/2 (falls back to HTTP/1.1 without h2)
         """
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
@@ -21,13 +76,61 @@ class GeminiClient:
         self.base_url = "https://generativelanguage.googleapis.com/v1beta"
         self.generation_model = "gemini-pro"
         self.embedding_model = "models/embedding-001"
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            print("[Gemini Client] h2 is not installed, using HTTP/1.1 keep-alive")
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared AsyncClient, created on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                headers={"Content-Type": "application/json"},
+                params={"key": self.api_key},
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "GeminiClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+    
+    def _generation_body(self, prompt: str) -> Dict[str, Any]:
+        return {
+            "contents": [
+                {"parts": [{"text": prompt}]}
+            ],
+            "generationConfig": {
+                "temperature": 0.7,
+                "topK": 40,
+                "topP": 0.95,
+                "maxOutputTokens": 1024,
+            }
+        }
     
-    async def generate_content(self, prompt: str) -> str:
+    async def generate_content(self, prompt: str, timeout: float = 30) -> str:
         """
         Generate content using Gemini API.
         
         Args:
             prompt: The text prompt to send to Gemini
+            timeout: Seconds to wait for the response
             
         Returns:
             The generated text response
@@ -36,36 +139,65 @@ class GeminiClient:
             HTTPException: If the API call fails
         """
         url = f"{self.base_url}/models/{self.generation_model}:generateContent"
-        headers = {"Content-Type": "application/json"}
-        params = {"key": self.api_key}
-        
-        # Prepare request body
-        body = {
-            "contents": [
-                {"parts": [{"text": prompt}]}
-            ],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 1024,
-            }
-        }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, params=params, json=body, timeout=30)
+            response = await self.client.post(url, json=self._generation_body(prompt), timeout=timeout)
+            
+            # Handle non-200 responses
+            if response.status_code != 200:
+                error_data = response.json()
+                error_message = error_data.get("error", {}).get("message", "Unknown API error")
+                raise HTTPException(status_code=response.status_code, detail=error_message)
+            
+            # Extract and return the generated text
+            result = response.json()
+            return result["candidates"][0]["content"]["parts"][0]["text"]
                 
-                # Handle non-200 responses
+        except HTTPException:
+            raise
+        except httpx.TimeoutException:
+            raise HTTPException(status_code=504, detail="Request to Gemini API timed out")
+        except httpx.RequestError as e:
+            raise HTTPException(status_code=502, detail=f"Error communicating with Gemini API: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+    
+    async def stream_content(self, prompt: str, timeout: float = 30) -> AsyncIterator[str]:
+        """
+        Stream generated content from the Gemini API as server-sent events.
+        
+        Args:
+            prompt: The text prompt to send to Gemini
+            timeout: Seconds to wait for the response to start, and between chunks
+            
+        Yields:
+            Text chunks in the order the model produces them
+            
+        Raises:
+            HTTPException: If the API call fails
+        """
+        url = f"{self.base_url}/models/{self.generation_model}:streamGenerateContent"
+        
+        try:
+            async with self.client.stream(
+                "POST", url, params={"alt": "sse"}, json=self._generation_body(prompt), timeout=timeout
+            ) as response:
                 if response.status_code != 200:
-                    error_data = response.json()
-                    error_message = error_data.get("error", {}).get("message", "Unknown API error")
+                    await response.aread()
+                    error_message = response.json().get("error", {}).get("message", "Unknown API error")
                     raise HTTPException(status_code=response.status_code, detail=error_message)
                 
-                # Extract and return the generated text
-                result = response.json()
-                return result["candidates"][0]["content"]["parts"][0]["text"]
-                
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    candidates = json.loads(line[len("data:"):]).get("candidates", [])
+                    parts = candidates[0].get("content", {}).get("parts", []) if candidates else []
+                    text = "".join(part.get("text", "") for part in parts)
+                    if text:
+                        yield text
+                        
+        except HTTPException:
+            raise
         except httpx.TimeoutException:
             raise HTTPException(status_code=504, detail="Request to Gemini API timed out")
         except httpx.RequestError as e:
@@ -73,12 +205,19 @@ class GeminiClient:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
     
-    async def generate_embeddings(self, text: str) -> List[float]:
+    async def generate_embeddings(
+        self,
+        text: str,
+        task_type: str = "RETRIEVAL_DOCUMENT",
+        timeout: float = 10
+    ) -> List[float]:
         """
         Generate embeddings for the given text.
         
         Args:
             text: Text to generate embeddings for
+            task_type: Embedding task type the vector is optimised for
+            timeout: Seconds to wait for the response
             
         Returns:
             List of embedding values
@@ -87,31 +226,96 @@ class GeminiClient:
             HTTPException: If the API call fails
         """
         url = f"{self.base_url}/{self.embedding_model}:embedContent"
-        headers = {"Content-Type": "application/json"}
-        params = {"key": self.api_key}
         
         # Prepare request body
         body = {
-            "content": {"parts": [{"text": text}]},
-            "taskType": "RETRIEVAL_DOCUMENT"
+            "content": {"parts": [{"text": (text or "")[:EMBED_MAX_TEXT_CHARS]}]},
+            "taskType": task_type.upper()
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, params=params, json=body, timeout=10)
-                
-                # Handle non-200 responses
-                if response.status_code != 200:
-                    error_data = response.json()
-                    error_message = error_data.get("error", {}).get("message", "Unknown API error")
-                    raise HTTPException(status_code=response.status_code, detail=error_message)
-                
-                # Extract and return embeddings
-                result = response.json()
-                return result.get("embedding", {}).get("values", [])
+            response = await self.client.post(url, json=body, timeout=timeout)
+            
+            # Handle non-200 responses
+            if response.status_code != 200:
+                error_data = response.json()
+                error_message = error_data.get("error", {}).get("message", "Unknown API error")
+                raise HTTPException(status_code=response.status_code, detail=error_message)
+            
+            # Extract and return embeddings
+            result = response.json()
+            return result.get("embedding", {}).get("values", [])
                 
         except Exception as e:
             # For production, consider returning an empty list instead of raising an exception
             # to prevent embeddings issues from breaking the core functionality
             print(f"Embedding generation error: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+    
+    async def batch_embeddings(
+        self,
+        texts: List[str],
+        task_type: str = "RETRIEVAL_DOCUMENT",
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        timeout: float = 30
+    ) -> List[List[float]]:
+        """
+        Generate embeddings for many texts with the batchEmbedContents endpoint.
+        
+        Texts are split into batches by count and size, and up to
+        max_concurrency batches are in flight at once. Rate limits (429),
+        server errors and timeouts are retried with exponential backoff.
+        
+        Args:
+            texts: Texts to generate embeddings for
+            task_type: Embedding task type, as in generate_embeddings
+            batch_size: Most texts per request (the API allows 100)
+            max_concurrency: Most requests in flight at once
+            max_retries: Retries per batch before giving up on it
+            timeout: Seconds to wait for each request
+            
+        Returns:
+            One list of embedding values per text, in order; empty for texts
+            whose batch failed
+        """
+        url = f"{self.base_url}/{self.embedding_model}:batchEmbedContents"
+        results: List[List[float]] = [[] for _ in texts]
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def embed_batch(indices: List[int]) -> None:
+            body = {
+                "requests": [
+                    {
+                        "model": self.embedding_model,
+                        "content": {"parts": [{"text": (texts[i] or "")[:EMBED_MAX_TEXT_CHARS]}]},
+                        "taskType": task_type.upper()
+                    }
+                    for i in indices
+                ]
+            }
+            for attempt in range(max_retries + 1):
+                try:
+                    async with semaphore:
+                        response = await self.client.post(url, json=body, timeout=timeout)
+                    if response.status_code == 200:
+                        embeddings = response.json().get("embeddings", [])
+                        for i, embedding in zip(indices, embeddings):
+                            results[i] = embedding.get("values", [])
+                        return
+                    retryable = response.status_code == 429 or response.status_code >= 500
+                    try:
+                        error = response.json().get("error", {}).get("message", "Unknown API error")
+                    except ValueError:
+                        error = response.text[:200]
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    retryable, error = True, str(e)
+                if not retryable or attempt == max_retries:
+                    print(f"Batch embedding error ({len(indices)} texts): {error}")
+                    return
+                # Exponential backoff with jitter so concurrent batches don't retry in lockstep
+                await asyncio.sleep(2 ** attempt + random.random())
+        
+        await asyncio.gather(*(embed_batch(batch) for batch in chunk_texts(texts, batch_size)))
+        return results
\ No newline at end of file
@@ -1,27 +1,21 @@
 # backend/generators/game_script_generator.py
-from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
-async def generate_game_script(
-    db,
-    user_id: str,
+def build_game_script_prompt(
     input_text: str,
-    session_id: Optional[str] = None,
-    previous_output: Optional[str] = None,
-    gemini_generate_fn = None
-):
-    """Generate game scripts based on user input
+    previous_output: Optional[str] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """Build the Gemini prompt for a game script request
+    
+    The characters in the script are only known once it has been generated;
+    add them with extract_characters().
     
     Args:
-        db: MongoDB database connection
-        user_id: User ID requesting the generation
         input_text: Text prompt from the user
-        session_id: Optional session ID for continuing existing work
         previous_output: Previous output to continue from
-        gemini_generate_fn: Function to call Gemini API
         
     Returns:
-        Dict containing the generated output and metadata
+        Tuple of the prompt and the metadata stored with the output
     """
     # Determine script type (dialogue, narrative, quest, etc)
     script_types = ["dialogue", "quest", "narrative", "cutscene", "tutorial"]
@@ -56,37 +50,42 @@ Create a {detected_type} script that includes:
 Make it engaging and suitable for a video game context.
 """
     
+    return prompt, {
+        "type": "game_script",
+        "script_type": detected_type,
+        "mode": "extend" if is_continuation else "new"
+    }
+
+async def generate_game_script(
+    input_text: str,
+    previous_output: Optional[str] = None,
+    gemini_generate_fn = None
+):
+    """Generate game scripts based on user input
+    
+    Args:
+        input_text: Text prompt from the user
+        previous_output: Previous output to continue from
+        gemini_generate_fn: Function to call Gemini API
+        
+    Returns:
+        Dict containing the generated output and metadata; the caller stores it
+    """
+    prompt, metadata = build_game_script_prompt(input_text, previous_output)
+    
     # Generate the script content
     output = await gemini_generate_fn(prompt)
     
     # Extract characters from the script (basic detection)
     characters = extract_characters(output)
     
-    # Save to database if db connection is provided
-    if db:
-        # Create document to store
-        entry = {
-            "user_id": user_id,
-            "session_id": session_id,
-            "type": "game_script",
-            "script_type": detected_type,
-            "input_text": input_text,
-            "output": output,
-            "characters": characters,
-            "timestamp": datetime.utcnow(),
-            "mode": "extend" if is_continuation else "new"
-        }
-        
-        # Insert into the database
-        await db.creative_outputs.insert_one(entry)
-    
     # Return the generated content and metadata
     return {
         "output": output,
-        "type": "game_script",
-        "script_type": detected_type,
+        "type": metadata["type"],
+        "script_type": metadata["script_type"],
         "characters": characters,
-        "mode": "extend" if is_continuation else "new"
+        "mode": metadata["mode"]
     }
 
 def extract_characters(script_text: str) -> List[str]:
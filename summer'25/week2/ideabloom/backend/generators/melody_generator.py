@@ -1,27 +1,18 @@
 # backend/generators/melody_generator.py
-from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 
-async def generate_melody(
-    db,
-    user_id: str,
+def build_melody_prompt(
     input_text: str,
-    session_id: Optional[str] = None,
-    previous_output: Optional[str] = None,
-    gemini_generate_fn = None
-):
-    """Generate melodic descriptions or ABC notation based on user input
+    previous_output: Optional[str] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """Build the Gemini prompt for a melody request
     
     Args:
-        db: MongoDB database connection
-        user_id: User ID requesting the generation
         input_text: Text prompt from the user
-        session_id: Optional session ID for continuing existing work
         previous_output: Previous output to continue from
-        gemini_generate_fn: Function to call Gemini API
         
     Returns:
-        Dict containing the generated output and metadata
+        Tuple of the prompt and the metadata stored with the output
     """
     # Determine if this is a continuation request
     is_continuation = bool(previous_output) and any(
@@ -46,30 +37,34 @@ async def generate_melody(
         else:
             prompt = f"Describe a melodic theme based on: {input_text}. Include details about mood, tempo, key, and instrumentation."
     
-    # Generate the melody content
-    output = await gemini_generate_fn(prompt)
+    return prompt, {
+        "type": "melody",
+        "notation_type": "abc" if is_abc_notation else "descriptive",
+        "mode": "extend" if is_continuation else "new"
+    }
+
+async def generate_melody(
+    input_text: str,
+    previous_output: Optional[str] = None,
+    gemini_generate_fn = None
+):
+    """Generate melodic descriptions or ABC notation based on user input
     
-    # Save to database if db connection is provided
-    if db:
-        # Create document to store
-        entry = {
-            "user_id": user_id,
-            "session_id": session_id,
-            "type": "melody",
-            "input_text": input_text,
-            "output": output,
-            "notation_type": "abc" if is_abc_notation else "descriptive",
-            "timestamp": datetime.utcnow(),
-            "mode": "extend" if is_continuation else "new"
-        }
+    Args:
+        input_text: Text prompt from the user
+        previous_output: Previous output to continue from
+        gemini_generate_fn: Function to call Gemini API
         
-        # Insert into the database
-        await db.creative_outputs.insert_one(entry)
+    Returns:
+        Dict containing the generated output and metadata; the caller stores it
+    """
+    prompt, metadata = build_melody_prompt(input_text, previous_output)
+    
+    # Generate the melody content
+    output = await gemini_generate_fn(prompt)
     
     # Return the generated content and metadata
     return {
         "output": output,
-        "type": "melody",
-        "notation_type": "abc" if is_abc_notation else "descriptive",
-        "mode": "extend" if is_continuation else "new"
+        **metadata
     }
\ No newline at end of file
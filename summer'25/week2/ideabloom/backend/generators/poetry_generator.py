@@ -1,27 +1,18 @@
 # backend/generators/poetry_generator.py
-from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 
-async def generate_poetry(
-    db,
-    user_id: str,
+def build_poetry_prompt(
     input_text: str,
-    session_id: str = None,
-    previous_output: str = None,
-    gemini_generate_fn = None
-):
-    """Generate poetry based on user input
+    previous_output: Optional[str] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """Build the Gemini prompt for a poetry request
     
     Args:
-        db: MongoDB database connection
-        user_id: User ID requesting the generation
         input_text: Text prompt from the user
-        session_id: Optional session ID for continuing existing work
         previous_output: Previous output to continue from
-        gemini_generate_fn: Function to call Gemini API
         
     Returns:
-        Dict containing the generated output and metadata
+        Tuple of the prompt and the metadata stored with the output
     """
     # Determine if this is a continuation request
     is_continuation = bool(previous_output) and any(
@@ -37,28 +28,33 @@ async def generate_poetry(
     else:
         prompt = f"Write a poem inspired by this prompt: {input_text}"
     
-    # Generate the poetry content
-    output = await gemini_generate_fn(prompt)
+    return prompt, {
+        "type": "poetry",
+        "mode": "extend" if is_continuation else "new"
+    }
+
+async def generate_poetry(
+    input_text: str,
+    previous_output: str = None,
+    gemini_generate_fn = None
+):
+    """Generate poetry based on user input
     
-    # Save to database if db connection is provided
-    if db:
-        # Create document to store
-        entry = {
-            "user_id": user_id,
-            "session_id": session_id,
-            "type": "poetry",
-            "input_text": input_text,
-            "output": output,
-            "timestamp": datetime.utcnow(),
-            "mode": "extend" if is_continuation else "new"
-        }
+    Args:
+        input_text: Text prompt from the user
+        previous_output: Previous output to continue from
+        gemini_generate_fn: Function to call Gemini API
         
-        # Insert into the database
-        await db.creative_outputs.insert_one(entry)
+    Returns:
+        Dict containing the generated output and metadata; the caller stores it
+    """
+    prompt, metadata = build_poetry_prompt(input_text, previous_output)
+    
+    # Generate the poetry content
+    output = await gemini_generate_fn(prompt)
     
     # Return the generated content and metadata
     return {
         "output": output,
-        "type": "poetry",
-        "mode": "extend" if is_continuation else "new"
+        **metadata
     }
\ No newline at end of file
@@ -0,0 +1,160 @@
+# backend/utils/auth.py
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import jwt
+from fastapi import HTTPException
+
+async def fetch_jwks(url: str) -> Dict[str, Any]:
+    """Fetch a JSON Web Key Set over HTTP without blocking the event loop"""
+    async with httpx.AsyncClient(timeout=10) as client:
+        response = await client.get(url)
+        response.raise_for_status()
+        return response.json()
+
+class JWKSCache:
+    """Signing keys from a JWKS endpoint, parsed once and cached.
+
+    The key set is refetched when it is older than ttl, or when a token names a
+    kid the cache doesn't know (Auth0 rotated its keys). Unknown-kid refreshes
+    are rate limited so tokens with made-up kids can't hammer the endpoint.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ttl: float = 3600,
+        min_refresh_interval: float = 30,
+        fetcher: Callable[[str], Awaitable[Dict[str, Any]]] = fetch_jwks
+    ):
+        """
+        Args:
+            url: JWKS endpoint, e.g. https://<domain>/.well-known/jwks.json
+            ttl: Seconds a fetched key set is used before it is refreshed
+            min_refresh_interval: Shortest gap between refreshes for unknown kids
+            fetcher: Async function returning the JWKS document for a URL
+                (swap in a local stub for testing)
+        """
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.fetcher = fetcher
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def refresh(self) -> None:
+        """Fetch the key set and parse every RSA key in it"""
+        jwks = await self.fetcher(self.url)
+        keys = {}
+        for key in jwks.get("keys", []):
+            if key.get("kty") == "RSA" and "kid" in key:
+                keys[key["kid"]] = jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(key))
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    async def get_key(self, kid: str):
+        """Return the public key for kid, or None if the JWKS doesn't have it"""
+        age = time.monotonic() - self._fetched_at
+        if age < self.ttl and kid in self._keys:
+            return self._keys[kid]
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another request may have refreshed while this one waited
+            age = time.monotonic() - self._fetched_at
+            if age >= self.ttl or (kid not in self._keys and age >= self.min_refresh_interval):
+                await self.refresh()
+        return self._keys.get(kid)
+
+class TokenVerifier:
+    """Verifies RS256 bearer tokens against a JWKSCache.
+
+    Tokens that verified successfully are remembered in a small LRU until
+    their exp, so repeat requests with the same token skip the signature check.
+    """
+
+    def __init__(
+        self,
+        jwks: JWKSCache,
+        audience: Optional[str],
+        issuer: Optional[str],
+        algorithms: Optional[List[str]] = None,
+        cache_size: int = 1024
+    ):
+        """
+        Args:
+            jwks: Source of the signing keys
+            audience: Expected aud claim
+            issuer: Expected iss claim
+            algorithms: Accepted signing algorithms
+            cache_size: Verified tokens remembered at once
+        """
+        self.jwks = jwks
+        self.audience = audience
+        self.issuer = issuer
+        self.algorithms = algorithms or ["RS256"]
+        self.cache_size = cache_size
+        self._verified: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _cached(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        entry = self._verified.get(token_hash)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at <= time.time():
+            del self._verified[token_hash]
+            return None
+        self._verified.move_to_end(token_hash)
+        return payload
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Verify a token and return its payload
+
+        Args:
+            token: Encoded JWT from the Authorization header
+
+        Returns:
+            The decoded token payload
+
+        Raises:
+            HTTPException: 401 if the token is invalid, expired or signed by an unknown key
+        """
+        # Keyed by a digest so the cache doesn't hold usable tokens
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        payload = self._cached(token_hash)
+        if payload is not None:
+            return payload
+
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            key = await self.jwks.get_key(kid) if kid else None
+            if key is None:
+                raise HTTPException(status_code=401, detail="Unable to find appropriate key")
+            payload = jwt.decode(
+                token,
+                key,
+                algorithms=self.algorithms,
+                audience=self.audience,
+                issuer=self.issuer
+            )
+        except HTTPException:
+            raise
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except (jwt.InvalidAudienceError, jwt.InvalidIssuerError):
+            raise HTTPException(status_code=401, detail="Invalid claims, check audience and issuer")
+        except Exception as e:
+            raise HTTPException(status_code=401, detail=f"Authentication error: {str(e)}")
+
+        # Only tokens that carry an expiry are cached, and only until then
+        if isinstance(payload.get("exp"), (int, float)):
+            self._verified[token_hash] = (payload["exp"], payload)
+            if len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return payload
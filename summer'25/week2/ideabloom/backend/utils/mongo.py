@@ -1,9 +1,17 @@
 # backend/utils/mongo.py
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
 import os
+import time
+import json
+import base64
+import binascii
 from dotenv import load_dotenv
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
 import uuid
 
 # Load environment variables
@@ -13,17 +21,136 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME", "creative_buddy")
 
-# Create client
-client = AsyncIOMotorClient(MONGO_URI)
-db = client[DB_NAME]
+# The process-wide client and collection references, set by init_db().
+# Everything (API routes, background workers, scripts) shares this one
+# client, so each process holds a single bounded connection pool
+client: Optional[AsyncIOMotorClient] = None
+db = None
+users_collection = None
+outputs_collection = None
+history_collection = None
+feedback_collection = None
 
-# Collection references
-users_collection = db["users"]
-outputs_collection = db["creative_outputs"]
-history_collection = db["history"]
-feedback_collection = db["feedback"]
+def create_client(
+    uri: Optional[str] = MONGO_URI,
+    max_pool_size: int = 50,
+    min_pool_size: int = 0,
+    max_idle_time_ms: int = 60000,
+    server_selection_timeout_ms: int = 5000,
+    connect_timeout_ms: int = 5000,
+    socket_timeout_ms: int = 30000,
+    write_concern: str = "majority",
+    wtimeout_ms: int = 5000
+) -> AsyncIOMotorClient:
+    """Create a Motor client with explicit pool, timeout and write concern settings
+    
+    Args:
+        uri: MongoDB connection string
+        max_pool_size: Most connections the pool opens per server
+        min_pool_size: Connections kept open while idle
+        max_idle_time_ms: Idle time after which a pooled connection is closed
+        server_selection_timeout_ms: How long an operation waits for a usable server
+        connect_timeout_ms: Timeout for opening a connection
+        socket_timeout_ms: Timeout for a single read or write on a connection
+        write_concern: "majority" or a number of acknowledging nodes
+        wtimeout_ms: How long a write waits for its write concern
+        
+    Returns:
+        The client; it connects lazily on first use
+    """
+    return AsyncIOMotorClient(
+        uri,
+        maxPoolSize=max_pool_size,
+        minPoolSize=min_pool_size,
+        maxIdleTimeMS=max_idle_time_ms,
+        serverSelectionTimeoutMS=server_selection_timeout_ms,
+        connectTimeoutMS=connect_timeout_ms,
+        socketTimeoutMS=socket_timeout_ms,
+        w=int(write_concern) if str(write_concern).isdigit() else write_concern,
+        wTimeoutMS=wtimeout_ms,
+        retryWrites=True
+    )
+
+def init_db(mongo_client: AsyncIOMotorClient, db_name: str = DB_NAME):
+    """Make a client the one this module (and everything importing it) uses
+    
+    Args:
+        mongo_client: Client from create_client()
+        db_name: Database holding the collections
+        
+    Returns:
+        The database handle
+    """
+    global client, db, users_collection, outputs_collection, history_collection, feedback_collection
+    client = mongo_client
+    db = client[db_name]
+    users_collection = db["users"]
+    outputs_collection = db["creative_outputs"]
+    history_collection = db["history"]
+    feedback_collection = db["feedback"]
+    return db
+
+def close_db() -> None:
+    """Close the shared client and its connection pool"""
+    global client
+    if client is not None:
+        client.close()
+        client = None
+
+async def ping() -> float:
+    """Round-trip a ping command through the shared client
+    
+    Returns:
+        Latency in milliseconds
+        
+    Raises:
+        Exception: If the server can't be reached within the selection timeout
+    """
+    start = time.perf_counter()
+    await db.command("ping")
+    return (time.perf_counter() - start) * 1000
 
-async def save_creative_output(
+# Embedding arrays are by far the largest fields; reads that only show
+# outputs leave them out
+OUTPUT_PROJECTION = {"embedding": 0, "prompt_embedding": 0}
+
+# Indexes for the read paths below, created at startup by ensure_indexes().
+# Each ends in _id so keyset pages (ordered by timestamp, then _id) come
+# straight off the index in either direction
+OUTPUT_INDEXES = [
+    # get_session_history: filter on session, ordered by time
+    IndexModel(
+        [("session_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+        name="session_timestamp_id"
+    ),
+    # get_user_outputs with a type filter, newest first
+    IndexModel(
+        [("user_id", ASCENDING), ("type", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+        name="user_type_timestamp_id"
+    ),
+    # get_user_outputs without a type filter; the index above can't sort those
+    IndexModel(
+        [("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+        name="user_timestamp_id"
+    ),
+    # One document per generation: retries carrying the same key never add another
+    IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key", unique=True, sparse=True),
+]
+
+async def ensure_indexes() -> None:
+    """Create the indexes the queries in this module rely on
+    
+    Safe to call on every startup: existing indexes with the same
+    definition are left alone.
+    """
+    await outputs_collection.create_indexes(OUTPUT_INDEXES)
+    await users_collection.create_index("user_id", name="user_id")
+
+def scoped_idempotency_key(user_id: str, idempotency_key: str) -> str:
+    """Stored form of a client's idempotency key, scoped to the user so keys can't collide"""
+    return f"{user_id}:{idempotency_key}"
+
+def build_creative_output(
     user_id: str,
     input_text: str,
     output: str,
@@ -31,9 +158,10 @@ async def save_creative_output(
     session_id: Optional[str] = None,
     mode: str = "new",
     metadata: Optional[Dict[str, Any]] = None,
-    embedding: Optional[List[float]] = None
+    embedding: Optional[List[float]] = None,
+    idempotency_key: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Save a creative output to the database
+    """Build a creative output document with its final _id, without saving it
     
     Args:
         user_id: User ID that generated the output
@@ -44,9 +172,10 @@ async def save_creative_output(
         mode: Generation mode (new or extend)
         metadata: Additional metadata for the output
         embedding: Vector embedding for semantic search
+        idempotency_key: Client-supplied key identifying the generation request
         
     Returns:
-        Dictionary with inserted document information
+        The document, ready to insert
     """
     # Create a new session ID if not provided
     if not session_id:
@@ -54,6 +183,7 @@ async def save_creative_output(
     
     # Prepare the document
     document = {
+        "_id": ObjectId(),
         "user_id": user_id,
         "session_id": session_id,
         "input_text": input_text,
@@ -64,38 +194,138 @@ async def save_creative_output(
         "embedding": embedding or []
     }
     
+    if idempotency_key:
+        document["idempotency_key"] = scoped_idempotency_key(user_id, idempotency_key)
+    
     # Add any additional metadata
     if metadata:
         document.update(metadata)
     
-    # Insert the document
-    result = await outputs_collection.insert_one(document)
+    return document
+
+async def upsert_creative_output(document: Dict[str, Any]) -> str:
+    """Store a built document once, even if its generation was retried
     
-    # Return useful information
-    return {
-        "output_id": str(result.inserted_id),
-        "session_id": session_id,
-        "timestamp": document["timestamp"].isoformat()
-    }
+    Documents with an idempotency_key are upserted on it, so when a document
+    for the same key already exists nothing is written and its id is returned.
+    
+    Args:
+        document: Document from build_creative_output()
+        
+    Returns:
+        The id of the stored document
+    """
+    key = document.get("idempotency_key")
+    if not key:
+        result = await outputs_collection.insert_one(document)
+        return str(result.inserted_id)
+    
+    try:
+        result = await outputs_collection.update_one(
+            {"idempotency_key": key},
+            {"$setOnInsert": document},
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            return str(result.upserted_id)
+    except DuplicateKeyError:
+        # A concurrent upsert for the same key won the race
+        pass
+    existing = await outputs_collection.find_one({"idempotency_key": key}, {"_id": 1})
+    return str(existing["_id"])
+
+async def get_output_by_idempotency_key(idempotency_key: str) -> Optional[Dict[str, Any]]:
+    """Find the output already stored for an idempotency key
+    
+    Args:
+        idempotency_key: Scoped key, as stored by build_creative_output()
+        
+    Returns:
+        The document without its embeddings, or None
+    """
+    return await outputs_collection.find_one({"idempotency_key": idempotency_key}, OUTPUT_PROJECTION)
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """Opaque page cursor pointing just past a document"""
+    position = {"t": document["timestamp"].isoformat(), "id": str(document["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Inverse of encode_cursor
+    
+    Raises:
+        ValueError: If the cursor wasn't produced by encode_cursor
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(position["t"]), ObjectId(position["id"])
+    except (binascii.Error, UnicodeDecodeError, TypeError, KeyError, ValueError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+async def find_page(
+    query: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    newest_first: bool = True
+) -> Dict[str, Any]:
+    """Keyset-paginated find over creative outputs, ordered by (timestamp, _id)
+    
+    Each page resumes from the position in the cursor instead of skipping
+    the documents before it, so deep pages cost the same as the first.
+    
+    Args:
+        query: Filter for the outputs
+        limit: Maximum number of outputs in the page
+        cursor: next_cursor of the previous page, None for the first page
+        newest_first: Order of the pages
+        
+    Returns:
+        Dict with the page's "items" and the "next_cursor" (None on the last page)
+        
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    direction = DESCENDING if newest_first else ASCENDING
+    if cursor:
+        timestamp, last_id = decode_cursor(cursor)
+        after = "$lt" if newest_first else "$gt"
+        query = {
+            **query,
+            "$or": [
+                {"timestamp": {after: timestamp}},
+                {"timestamp": timestamp, "_id": {after: last_id}}
+            ]
+        }
+    
+    # One extra document tells whether there is a next page
+    items = await outputs_collection.find(query, OUTPUT_PROJECTION).sort(
+        [("timestamp", direction), ("_id", direction)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+    
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return {"items": items[:limit], "next_cursor": next_cursor}
 
 async def get_session_history(
     session_id: str,
-    limit: int = 10
-) -> List[Dict[str, Any]]:
-    """Get the history of a specific session
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    newest_first: bool = False
+) -> Dict[str, Any]:
+    """Get the history of a specific session, one page at a time
     
     Args:
         session_id: The session ID to retrieve history for
         limit: Maximum number of history items to return
+        cursor: next_cursor of the previous page, None for the first page
+        newest_first: Return the latest items first instead of the oldest
         
     Returns:
-        List of history items for the session, ordered by timestamp
+        Dict with the history "items" ordered by timestamp and the "next_cursor"
+        
+    Raises:
+        ValueError: If the cursor is invalid
     """
-    cursor = outputs_collection.find(
-        {"session_id": session_id}
-    ).sort("timestamp", 1).limit(limit)
-    
-    return await cursor.to_list(length=limit)
+    return await find_page({"session_id": session_id}, limit, cursor, newest_first)
 
 async def save_user_feedback(
     user_id: str,
@@ -129,9 +359,9 @@ async def save_user_feedback(
     # Insert the feedback
     await feedback_collection.insert_one(feedback)
     
-    # Also update the original output document
+    # Also update the original output document (its _id is an ObjectId, not the string the client has)
     update_result = await outputs_collection.update_one(
-        {"_id": output_id},
+        {"_id": ObjectId(output_id) if ObjectId.is_valid(output_id) else output_id},
         {"$set": {"has_feedback": True}}
     )
     
@@ -141,27 +371,54 @@ async def get_user_outputs(
     user_id: str,
     output_type: Optional[str] = None,
     limit: int = 20,
-    skip: int = 0
-) -> List[Dict[str, Any]]:
-    """Get outputs for a specific user
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """Get outputs for a specific user, newest first, one page at a time
     
     Args:
         user_id: User ID to get outputs for
         output_type: Optional type filter (poetry, melody, script)
         limit: Maximum number of outputs to return
-        skip: Number of outputs to skip (for pagination)
+        cursor: next_cursor of the previous page, None for the first page
         
     Returns:
-        List of user outputs
+        Dict with the page's "items" and the "next_cursor" (None on the last page)
+        
+    Raises:
+        ValueError: If the cursor is invalid
     """
     # Build query
     query = {"user_id": user_id}
     if output_type:
         query["type"] = output_type
     
-    # Execute query
-    cursor = outputs_collection.find(query).sort(
-        "timestamp", -1  # Newest first
-    ).skip(skip).limit(limit)
+    return await find_page(query, limit, cursor)
+
+async def get_user_settings(user_id: str) -> Dict[str, Any]:
+    """Get a user's stored settings
+    
+    Args:
+        user_id: User ID to get settings for
+        
+    Returns:
+        Dict of settings, empty if the user never saved any
+    """
+    user = await users_collection.find_one({"user_id": user_id}, {"settings": 1})
+    return (user or {}).get("settings", {})
+
+async def update_user_settings(user_id: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge settings into a user's stored settings
     
-    return await cursor.to_list(length=limit)
\ No newline at end of file
+    Args:
+        user_id: User ID to update
+        settings: Settings to set, e.g. {"semantic_cache": False}
+        
+    Returns:
+        The user's settings after the update
+    """
+    await users_collection.update_one(
+        {"user_id": user_id},
+        {"$set": {f"settings.{key}": value for key, value in settings.items()}},
+        upsert=True
+    )
+    return await get_user_settings(user_id)
@@ -0,0 +1,170 @@
+# backend/utils/semantic_cache.py
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+class SemanticCache:
+    """In-process cache of recent outputs, looked up by prompt similarity.
+
+    Each entry holds the embedding of the prompt that produced an output, a
+    partition key (the user, unless the cache is shared, plus the content
+    type and the prompt-derived metadata such as the melody notation or
+    script type, so a hit is always the same kind of output) and the output
+    itself. A lookup returns the most similar entry in the same partition if
+    its cosine similarity reaches the threshold.
+
+    Prompt embeddings are computed by the write-behind worker in the same
+    batch embedding call as the output embeddings and stored on the document
+    next to them; entries are added once their document is written. The
+    request path only embeds a prompt itself when its partition has entries
+    a lookup could hit.
+
+    Entries live in a fixed-size ring, so the oldest are evicted first, and
+    expire after ttl seconds. The ring is warmed from the prompt embeddings
+    stored on recent documents at startup.
+
+    Only fresh ("new") generations belong here: callers must not look up or
+    add extend requests, whose output depends on the previous one.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl: float = 86400,
+        max_entries: int = 10000,
+        shared: bool = False
+    ):
+        """
+        Args:
+            threshold: Minimum cosine similarity between prompts for a hit
+            ttl: Seconds an entry can be served after it was generated
+            max_entries: Entries kept before the oldest are overwritten
+            shared: Serve one user's outputs to other users; off by default,
+                so each user only gets their own earlier outputs back
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self._embeddings: Optional[np.ndarray] = None
+        self._created = np.zeros(max_entries, np.float64)
+        self._keys = np.full(max_entries, None, dtype=object)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._next = 0
+        self.lookups = 0
+        self.hits = 0
+        self.skipped = 0
+
+    def partition_key(self, metadata: Dict[str, Any], user_id: str) -> str:
+        """Partition for a request, from its user and the metadata its prompt builder returns"""
+        scope = {"metadata": metadata}
+        if not self.shared:
+            scope["user_id"] = user_id
+        return json.dumps(scope, sort_keys=True)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if vector.ndim == 1 and norm > 0 else None
+
+    def add(self, embedding: List[float], key: str, entry: Dict[str, Any], created: Optional[float] = None) -> None:
+        """Add an output under its prompt embedding and partition key"""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        if self._embeddings is None:
+            self._embeddings = np.zeros((self.max_entries, vector.size), np.float32)
+        if vector.size != self._embeddings.shape[1]:
+            return
+        slot = self._next
+        self._embeddings[slot] = vector
+        self._created[slot] = created if created is not None else time.time()
+        self._keys[slot] = key
+        self._entries[slot] = entry
+        self._next = (slot + 1) % self.max_entries
+
+    def add_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """Add stored outputs that carry a prompt embedding and partition key
+
+        Returns:
+            Number of entries added
+        """
+        added = 0
+        for doc in documents:
+            if not doc.get("prompt_embedding") or not doc.get("cache_key") or doc.get("mode", "new") != "new":
+                continue
+            metadata = {k: doc[k] for k in ("notation_type", "script_type", "characters") if k in doc}
+            self.add(
+                doc["prompt_embedding"],
+                doc["cache_key"],
+                {"output": doc.get("output", ""), "output_id": str(doc["_id"]), "metadata": metadata},
+                # Stored timestamps are naive UTC
+                created=(doc["timestamp"] - datetime(1970, 1, 1)).total_seconds()
+            )
+            added += 1
+        return added
+
+    def has_entries(self, key: str) -> bool:
+        """Whether the partition holds any live entry, i.e. whether a lookup could hit"""
+        return bool(np.any((self._created > time.time() - self.ttl) & (self._keys == key)))
+
+    def miss(self) -> None:
+        """Count a lookup answered without embedding the prompt, because its partition is empty"""
+        self.lookups += 1
+
+    def lookup(self, embedding: List[float], key: str) -> Optional[Dict[str, Any]]:
+        """Return the closest cached entry in the partition, or None below the threshold"""
+        self.lookups += 1
+        vector = self._normalize(embedding)
+        if vector is None or self._embeddings is None or vector.size != self._embeddings.shape[1]:
+            return None
+        candidates = np.flatnonzero((self._created > time.time() - self.ttl) & (self._keys == key))
+        if not candidates.size:
+            return None
+        similarities = self._embeddings[candidates] @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        self.hits += 1
+        return dict(self._entries[candidates[best]], similarity=float(similarities[best]))
+
+    def skip(self) -> None:
+        """Count a request that bypassed the cache (extend request or opted out)"""
+        self.skipped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        live = int(np.count_nonzero(self._created > time.time() - self.ttl))
+        return {
+            "entries": live,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "skipped": self.skipped,
+        }
+
+    async def load(self, collection) -> int:
+        """Warm the cache from recent documents that stored a prompt embedding
+
+        Args:
+            collection: Motor collection holding the creative outputs
+
+        Returns:
+            Number of entries loaded
+        """
+        cursor = collection.find(
+            {
+                "prompt_embedding.0": {"$exists": True},
+                "cache_key": {"$exists": True},
+                "mode": "new",
+                "timestamp": {"$gte": datetime.utcnow() - timedelta(seconds=self.ttl)},
+            },
+            {"prompt_embedding": 1, "cache_key": 1, "output": 1, "timestamp": 1, "mode": 1,
+             "notation_type": 1, "script_type": 1, "characters": 1}
+        ).sort("timestamp", -1).limit(self.max_entries)
+        docs = await cursor.to_list(length=self.max_entries)
+        # Oldest first, so the ring evicts them first
+        return self.add_documents(list(reversed(docs)))
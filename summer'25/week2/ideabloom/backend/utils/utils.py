@@ -1,15 +1,43 @@
 # backend/utils/utils.py
 import os
-import json
-import google.generativeai as genai
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, AsyncIterator
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+from backend.clients.gemini_client import GeminiClient
 
-# Load generative model
-model = genai.GenerativeModel("gemini-pro")
-embed_model = genai.get_model("models/embedding-001")
+# The process-wide pooled client, set by init_gemini(). Every Gemini call in
+# this module goes through it, so they reuse warm connections
+gemini_client: Optional[GeminiClient] = None
+
+# The semaphore caps how many calls are in flight at once across all requests.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+GEMINI_EMBED_TIMEOUT = float(os.getenv("GEMINI_EMBED_TIMEOUT", "10"))
+GEMINI_EMBED_RETRIES = int(os.getenv("GEMINI_EMBED_RETRIES", "3"))
+# Batch embedding (the write-behind worker) has its own limit instead of taking
+# semaphore slots that interactive requests are waiting for
+GEMINI_EMBED_BATCH_CONCURRENCY = int(os.getenv("GEMINI_EMBED_BATCH_CONCURRENCY", "4"))
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+def init_gemini(client: Optional[GeminiClient]) -> None:
+    """Make a client the one this module's Gemini calls use
+    
+    Args:
+        client: Pooled client, or None to fall back to a default one on next use
+    """
+    global gemini_client
+    gemini_client = client
+
+def get_gemini_client() -> GeminiClient:
+    """Return the shared client, creating one with default limits if none was set
+    
+    Raises:
+        ValueError: If GEMINI_API_KEY is not set
+    """
+    global gemini_client
+    if gemini_client is None:
+        gemini_client = GeminiClient()
+    return gemini_client
 
 def detect_extend_intent(input_text: str) -> bool:
     """Detect if the user's prompt indicates an intent to extend previous output.
@@ -70,40 +98,109 @@ async def generate_text_gemini(prompt: str) -> str:
         Generated text from the model
         
     Raises:
-        Exception: If generation fails
+        Exception: If generation fails or times out
     """
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        async with gemini_semaphore:
+            text = await asyncio.wait_for(
+                get_gemini_client().generate_content(prompt, timeout=GEMINI_TIMEOUT),
+                timeout=GEMINI_TIMEOUT
+            )
+        return text.strip()
+    except asyncio.TimeoutError:
+        print(f"[Gemini Text Generation Error] timed out after {GEMINI_TIMEOUT}s")
+        raise Exception(f"Error generating content: Gemini did not respond within {GEMINI_TIMEOUT}s")
     except Exception as e:
         print(f"[Gemini Text Generation Error] {e}")
         raise Exception(f"Error generating content: {str(e)}")
 
-async def embed_text_gemini(text: str) -> List[float]:
+async def stream_text_gemini(prompt: str) -> AsyncIterator[str]:
+    """Streams content from Gemini Pro chunk by chunk as it is generated.
+    
+    Args:
+        prompt: The prompt for generation
+        
+    Yields:
+        Text chunks in the order the model produces them
+        
+    Raises:
+        Exception: If generation fails, or no chunk arrives within GEMINI_TIMEOUT
+    """
+    try:
+        async with gemini_semaphore:
+            chunks = get_gemini_client().stream_content(prompt, timeout=GEMINI_TIMEOUT).__aiter__()
+            while True:
+                # The timeout applies between chunks, so long outputs can keep streaming
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=GEMINI_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+    except asyncio.TimeoutError:
+        print(f"[Gemini Text Streaming Error] no data for {GEMINI_TIMEOUT}s")
+        raise Exception(f"Error generating content: Gemini did not respond within {GEMINI_TIMEOUT}s")
+    except Exception as e:
+        print(f"[Gemini Text Streaming Error] {e}")
+        raise Exception(f"Error generating content: {str(e)}")
+
+async def embed_text_gemini(text: str, task_type: str = "retrieval_document") -> List[float]:
     """Generates embeddings using Gemini Embed.
     
     Args:
         text: Text to generate embeddings for
+        task_type: Gemini embedding task type the vector is optimised for
         
     Returns:
-        List of embedding values
+        List of embedding values, empty if embedding fails or times out
     """
     try:
-        result = embed_model.embed_content(
-            content=text,
-            task_type="retrieval_document"
-        )
-        return result["embedding"]
+        async with gemini_semaphore:
+            return await asyncio.wait_for(
+                get_gemini_client().generate_embeddings(text, task_type, timeout=GEMINI_EMBED_TIMEOUT),
+                timeout=GEMINI_EMBED_TIMEOUT
+            )
+    except asyncio.TimeoutError:
+        print(f"[Gemini Embedding Error] timed out after {GEMINI_EMBED_TIMEOUT}s")
+        return []
     except Exception as e:
         print(f"[Gemini Embedding Error] {e}")
         return []
 
+async def embed_texts_gemini(texts: List[str], task_type: str = "retrieval_document") -> List[List[float]]:
+    """Generates embeddings for many texts with batched Gemini Embed calls.
+    
+    A thin wrapper over GeminiClient.batch_embeddings on the shared client.
+    At most GEMINI_EMBED_BATCH_CONCURRENCY batches are in flight per call;
+    they don't use gemini_semaphore, so bulk embedding never holds slots
+    interactive requests are waiting for.
+    
+    Args:
+        texts: Texts to generate embeddings for
+        task_type: Gemini embedding task type the vectors are optimised for
+        
+    Returns:
+        One list of embedding values per text, in order; empty for texts
+        whose batch still failed after GEMINI_EMBED_RETRIES retries
+    """
+    try:
+        return await get_gemini_client().batch_embeddings(
+            texts,
+            task_type=task_type,
+            max_retries=GEMINI_EMBED_RETRIES,
+            max_concurrency=GEMINI_EMBED_BATCH_CONCURRENCY,
+            timeout=GEMINI_EMBED_TIMEOUT
+        )
+    except Exception as e:
+        print(f"[Gemini Embedding Error] {e}")
+        return [[] for _ in texts]
+
 async def find_similar_outputs(
     db, 
     query_text: str, 
     user_id: Optional[str] = None, 
     content_type: Optional[str] = None,
-    limit: int = 5
+    limit: int = 5,
+    index=None
 ) -> List[Dict[str, Any]]:
     """Find similar outputs based on semantic similarity
     
@@ -113,6 +210,8 @@ async def find_similar_outputs(
         user_id: Optional user ID to filter results
         content_type: Optional content type to filter results
         limit: Maximum number of results to return
+        index: Optional LocalVectorIndex to search instead of the Atlas
+            "creative_outputs_vector" search index
         
     Returns:
         List of similar outputs with similarity scores
@@ -123,6 +222,9 @@ async def find_similar_outputs(
         
         if not query_embedding:
             return []
+        
+        if index is not None:
+            return await find_similar_outputs_local(db, index, query_embedding, user_id, content_type, limit)
             
         # Build the aggregation pipeline
         pipeline = [
@@ -169,4 +271,37 @@ async def find_similar_outputs(
         
     except Exception as e:
         print(f"[Vector Search Error] {e}")
-        return []
\ No newline at end of file
+        return []
+
+async def find_similar_outputs_local(
+    db,
+    index,
+    query_embedding: List[float],
+    user_id: Optional[str] = None,
+    content_type: Optional[str] = None,
+    limit: int = 5
+) -> List[Dict[str, Any]]:
+    """Find similar outputs with the in-process vector index
+    
+    Args:
+        db: MongoDB database connection
+        index: LocalVectorIndex holding the output embeddings
+        query_embedding: Embedding of the query text
+        user_id: Optional user ID to filter results
+        content_type: Optional content type to filter results
+        limit: Maximum number of results to return
+        
+    Returns:
+        List of similar outputs with similarity scores, shaped like the Atlas results
+    """
+    matches = index.search(query_embedding, limit, user_id, content_type)
+    if not matches:
+        return []
+    scores = dict(matches)
+    docs = await db.creative_outputs.find(
+        {"_id": {"$in": list(scores)}},
+        {"_id": 1, "type": 1, "input_text": 1, "output": 1, "timestamp": 1}
+    ).to_list(len(scores))
+    for doc in docs:
+        doc["score"] = scores[doc["_id"]]
+    return sorted(docs, key=lambda doc: doc["score"], reverse=True)
@@ -0,0 +1,295 @@
+# backend/utils/vector_index.py
+import asyncio
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+class LocalVectorIndex:
+    """In-process vector index over the embeddings of creative outputs.
+
+    A stand-in for the Atlas vector search index where there is none (local
+    Mongo, tests, air-gapped deployments). Vectors are normalised and kept in
+    one float32 matrix, so scores are cosine similarities.
+
+    Small collections are searched exactly. Once the index holds
+    train_threshold vectors it also builds an IVF (inverted file) layout:
+    k-means centroids partition the vectors into lists and a query only
+    scores the nprobe lists whose centroids are closest to it. The layout is
+    rebuilt in a worker thread whenever the index has doubled since it was
+    last trained; vectors added in between go to their nearest list.
+
+    user_id/type filters are applied inside the search. A filter narrower
+    than exact_limit rows (one user's outputs, usually) is searched exactly,
+    which is both faster and complete.
+
+    Memory is about 4 bytes per dimension per output (~3 KB for 768-d
+    embeddings, so ~300 MB at 100k outputs).
+    """
+
+    def __init__(
+        self,
+        nprobe: int = 8,
+        train_threshold: int = 20000,
+        exact_limit: int = 20000,
+        train_sample: int = 20000,
+        train_iterations: int = 10
+    ):
+        """
+        Args:
+            nprobe: IVF lists scored per query
+            train_threshold: Vectors needed before the IVF layout is built
+            exact_limit: Filtered candidate sets up to this size are searched exactly
+            train_sample: Vectors k-means is trained on
+            train_iterations: k-means iterations per training
+        """
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.exact_limit = exact_limit
+        self.train_sample = train_sample
+        self.train_iterations = train_iterations
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._users = np.zeros(0, np.int32)
+        self._types = np.zeros(0, np.int32)
+        self._count = 0
+        self._ids: List[Any] = []
+        self._rows: Dict[Any, int] = {}
+        self._user_codes: Dict[str, int] = {}
+        self._type_codes: Dict[str, int] = {}
+        self._user_rows: Dict[int, List[int]] = {}
+
+        # IVF layout: rows of each list at training time, plus rows added since
+        self._centroids: Optional[np.ndarray] = None
+        self._list_rows: List[np.ndarray] = []
+        self._list_added: List[List[int]] = []
+        self._trained_count = 0
+        self._training = False
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        return None if self._vectors is None else self._vectors.shape[1]
+
+    def _grow(self, needed: int, dimensions: int) -> None:
+        if self._vectors is None:
+            capacity = max(1024, needed)
+            self._vectors = np.zeros((capacity, dimensions), np.float32)
+            self._users = np.zeros(capacity, np.int32)
+            self._types = np.zeros(capacity, np.int32)
+        elif needed > len(self._vectors):
+            capacity = max(needed, 2 * len(self._vectors))
+            for name in ("_vectors", "_users", "_types"):
+                old = getattr(self, name)
+                new = np.zeros((capacity,) + old.shape[1:], old.dtype)
+                new[:self._count] = old[:self._count]
+                setattr(self, name, new)
+
+    @staticmethod
+    def _code(codes: Dict[str, int], value: Optional[str]) -> int:
+        return codes.setdefault(value or "", len(codes))
+
+    def add(self, items: Iterable[Tuple[Any, List[float], Optional[str], Optional[str]]]) -> int:
+        """Add (output_id, embedding, user_id, type) tuples
+
+        Outputs already in the index, empty embeddings and embeddings of a
+        different size than the first one are skipped.
+
+        Returns:
+            Number of vectors added
+        """
+        rows = [
+            (output_id, embedding, user_id, content_type)
+            for output_id, embedding, user_id, content_type in items
+            if embedding is not None and len(embedding) and output_id not in self._rows
+        ]
+        if not rows:
+            return 0
+        vectors = np.asarray([embedding for _, embedding, _, _ in rows], np.float32)
+        if vectors.ndim != 2 or (self.dimensions is not None and vectors.shape[1] != self.dimensions):
+            return 0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1)
+
+        with self._lock:
+            start = self._count
+            self._grow(start + len(rows), vectors.shape[1])
+            self._vectors[start:start + len(rows)] = vectors
+            for row, (output_id, _, user_id, content_type) in enumerate(rows, start):
+                user = self._code(self._user_codes, user_id)
+                self._users[row] = user
+                self._types[row] = self._code(self._type_codes, content_type)
+                self._user_rows.setdefault(user, []).append(row)
+                self._rows[output_id] = row
+                self._ids.append(output_id)
+            self._count += len(rows)
+            if self._centroids is not None:
+                self._assign(np.arange(start, self._count))
+        self._maybe_train()
+        return len(rows)
+
+    def add_documents(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """Add creative_outputs documents that have an embedding"""
+        return self.add(
+            (doc["_id"], doc.get("embedding"), doc.get("user_id"), doc.get("type"))
+            for doc in documents
+        )
+
+    def _assign(self, rows: np.ndarray) -> None:
+        lists = np.argmax(self._vectors[rows] @ self._centroids.T, axis=1)
+        for row, list_id in zip(rows.tolist(), lists.tolist()):
+            self._list_added[list_id].append(row)
+
+    def _maybe_train(self) -> None:
+        if self._training:
+            return
+        if self._count < max(self.train_threshold, 2 * self._trained_count):
+            return
+        self._training = True
+        try:
+            # Inside the event loop, train without blocking it
+            asyncio.get_running_loop().run_in_executor(None, self.train)
+        except RuntimeError:
+            self.train()
+
+    def train(self) -> None:
+        """Build the IVF layout from the vectors added so far"""
+        self._training = True
+        try:
+            with self._lock:
+                count = self._count
+                vectors = self._vectors[:count]
+            rng = np.random.default_rng(0)
+            nlist = max(1, int(np.sqrt(count)))
+            sample = vectors[rng.choice(count, min(count, max(self.train_sample, nlist)), replace=False)]
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+            for _ in range(self.train_iterations):
+                assignment = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, sample)
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                # Lists that lost every vector keep their old centroid
+                centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1), centroids)
+
+            # Rows before count never move in the matrix, so they can be assigned outside the lock
+            assignment = np.concatenate([
+                np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+                for start in range(0, count, 65536)
+            ])
+            order = np.argsort(assignment, kind="stable")
+            bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+            list_rows = [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(nlist)]
+
+            with self._lock:
+                self._centroids = centroids
+                self._list_rows = list_rows
+                self._list_added = [[] for _ in range(nlist)]
+                self._trained_count = count
+                if self._count > count:
+                    self._assign(np.arange(count, self._count))
+        except Exception as e:
+            print(f"[Vector Index Error] training failed: {e}")
+        finally:
+            self._training = False
+
+    def _filter(self, rows: np.ndarray, user: Optional[int], content_type: Optional[int]) -> np.ndarray:
+        if user is not None:
+            rows = rows[self._users[rows] == user]
+        if content_type is not None:
+            rows = rows[self._types[rows] == content_type]
+        return rows
+
+    def _score(self, rows: np.ndarray, query: np.ndarray, k: int) -> List[Tuple[Any, float]]:
+        if not rows.size:
+            return []
+        scores = self._vectors[rows] @ query
+        if rows.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(rows.size)
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[rows[i]], float(scores[i])) for i in top]
+
+    def search(
+        self,
+        embedding: List[float],
+        k: int = 5,
+        user_id: Optional[str] = None,
+        content_type: Optional[str] = None
+    ) -> List[Tuple[Any, float]]:
+        """Find the outputs closest to an embedding
+
+        Args:
+            embedding: Query vector
+            k: Maximum number of results
+            user_id: Only return this user's outputs
+            content_type: Only return outputs of this type
+
+        Returns:
+            (output_id, cosine similarity) pairs, most similar first
+        """
+        query = np.asarray(embedding, np.float32)
+        norm = np.linalg.norm(query)
+        if k <= 0 or query.ndim != 1 or norm == 0 or query.size != self.dimensions:
+            return []
+        query /= norm
+
+        with self._lock:
+            user = type_ = None
+            if user_id:
+                user = self._user_codes.get(user_id)
+                if user is None:
+                    return []
+            if content_type:
+                type_ = self._type_codes.get(content_type)
+                if type_ is None:
+                    return []
+
+            if user is not None:
+                rows = np.asarray(self._user_rows.get(user, []), np.int64)
+                if rows.size <= self.exact_limit:
+                    return self._score(self._filter(rows, None, type_), query, k)
+
+            if self._centroids is None or self._count <= self.exact_limit:
+                rows = self._filter(np.arange(self._count), user, type_)
+                return self._score(rows, query, k)
+
+            nprobe = min(self.nprobe, len(self._centroids))
+            probe = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+            rows = np.concatenate(
+                [self._list_rows[i] for i in probe] +
+                [np.asarray(self._list_added[i], np.int64) for i in probe]
+            )
+            results = self._score(self._filter(rows, user, type_), query, k)
+            if len(results) < k and (user is not None or type_ is not None):
+                # A selective filter left too few rows in the probed lists; search it exactly
+                rows = self._filter(np.arange(self._count), user, type_)
+                results = self._score(rows, query, k)
+            return results
+
+    async def load(self, collection, batch_size: int = 5000) -> int:
+        """Build the index from every stored output that has an embedding
+
+        Args:
+            collection: Motor collection holding the creative outputs
+            batch_size: Documents fetched and added at a time
+
+        Returns:
+            Number of vectors added
+        """
+        added = 0
+        cursor = collection.find(
+            {"embedding.0": {"$exists": True}},
+            {"embedding": 1, "user_id": 1, "type": 1}
+        ).batch_size(batch_size)
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                added += self.add_documents(batch)
+                batch = []
+        added += self.add_documents(batch)
+        return added
@@ -0,0 +1,250 @@
+# backend/utils/write_behind.py
+import asyncio
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+class WriteBehindQueue:
+    """Background writer for generated outputs.
+
+    Requests hand over a finished document and return straight away; a single
+    worker task collects documents into batches, embeds their outputs with
+    one batch embedding call and stores each batch with one bulk write. Every document
+    gets its ObjectId when it is enqueued, so the id returned to the client
+    is final before anything has been written.
+
+    Documents stay visible through pending() until their batch is written,
+    so callers that need to read them back (feedback, session history) can
+    either use the pending copy or flush() first.
+
+    Documents with an idempotency_key are upserted on it rather than
+    inserted, and a second document for a key that is still queued is not
+    queued again, so a retried generation is stored once.
+
+    Documents with a semantic cache_key but no prompt_embedding get their
+    input_text embedded in the same batch call as the outputs.
+
+    Their ids have already been handed out, so documents are never dropped:
+    a batch that fails to write (Mongo timeout, lost connection, a write
+    error other than a duplicate key) is retried with exponential backoff.
+    After max_retries attempts the rest are written one by one with
+    write_one, and whatever still fails keeps being retried until it is
+    stored.
+    """
+
+    def __init__(
+        self,
+        collection,
+        embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+        batch_size: int = 32,
+        max_wait: float = 0.2,
+        max_queue: int = 10000,
+        on_write: Optional[Callable[[List[Dict[str, Any]]], Any]] = None,
+        write_one: Optional[Callable[[Dict[str, Any]], Awaitable[str]]] = None,
+        max_retries: int = 5,
+        max_backoff: float = 30.0
+    ):
+        """
+        Args:
+            collection: Motor collection the documents are inserted into
+            embed_fn: Async function returning one embedding per output text, in order
+            batch_size: Most documents embedded and inserted together
+            max_wait: Seconds the first document of a batch waits for others
+            max_queue: Documents held before enqueue() starts rejecting them
+            on_write: Called with each batch once it is stored (e.g. to index it)
+            write_one: Async function storing a single document and returning its
+                stored id, used once a batch has failed max_retries times
+            max_retries: Batch write attempts before falling back to write_one
+            max_backoff: Longest wait in seconds between attempts
+        """
+        self.collection = collection
+        self.embed_fn = embed_fn
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.on_write = on_write
+        self.write_one = write_one
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._pending: Dict[ObjectId, Dict[str, Any]] = {}
+        self._pending_keys: Dict[str, Dict[str, Any]] = {}
+        self._worker: Optional[asyncio.Task] = None
+        self.written = 0
+        # Failed write attempts, counted per document; the documents are retried
+        self.failed = 0
+
+    def start(self) -> None:
+        """Start the worker task; call from inside the running event loop."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write everything still queued, then stop the worker.
+
+        Failed writes are retried, so this waits for as long as Mongo stays unreachable.
+        """
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    def enqueue(self, document: Dict[str, Any]) -> str:
+        """Queue a document for embedding and insertion.
+
+        Args:
+            document: Document to store; an "embedding" is added from its "output" unless it has one
+
+        Returns:
+            The document's id as a string, or the id of the document already
+            queued under the same idempotency_key
+
+        Raises:
+            asyncio.QueueFull: If the writer is too far behind
+        """
+        key = document.get("idempotency_key")
+        if key in self._pending_keys:
+            return str(self._pending_keys[key]["_id"])
+        document.setdefault("_id", ObjectId())
+        self._queue.put_nowait(document)
+        self._pending[document["_id"]] = document
+        if key:
+            self._pending_keys[key] = document
+        return str(document["_id"])
+
+    def pending(self, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Documents queued but not written yet, optionally only one session's"""
+        return [
+            doc for doc in self._pending.values()
+            if session_id is None or doc.get("session_id") == session_id
+        ]
+
+    def is_pending(self, output_id: str) -> bool:
+        return ObjectId.is_valid(output_id) and ObjectId(output_id) in self._pending
+
+    def find_pending(self, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        """The queued document for an idempotency key, if it hasn't been written yet"""
+        return self._pending_keys.get(idempotency_key)
+
+    async def flush(self) -> None:
+        """Wait until every document queued so far has been written."""
+        await self._queue.join()
+
+    async def _collect(self) -> List[Dict[str, Any]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _written(self, documents: List[Dict[str, Any]]) -> None:
+        self.written += len(documents)
+        if self.on_write is not None and documents:
+            try:
+                self.on_write(documents)
+            except Exception as e:
+                print(f"[Write Behind Error] on_write: {e}")
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Embed and bulk-write a batch; returns the documents that were not written"""
+        # Documents that already carry an embedding keep it
+        unembedded = [doc for doc in batch if not doc.get("embedding")]
+        unprompted = [doc for doc in batch if doc.get("cache_key") and not doc.get("prompt_embedding")]
+        embeddings = []
+        if unembedded or unprompted:
+            try:
+                embeddings = await self.embed_fn(
+                    [doc.get("output", "") for doc in unembedded] +
+                    [doc.get("input_text", "") for doc in unprompted]
+                )
+            except Exception as e:
+                # Stored without an embedding; backfill_embeddings.py fills it in later
+                print(f"[Write Behind Error] embedding failed: {e}")
+        for i, doc in enumerate(unembedded):
+            doc["embedding"] = embeddings[i] if i < len(embeddings) else []
+        for i, doc in enumerate(unprompted, len(unembedded)):
+            if i < len(embeddings) and embeddings[i]:
+                doc["prompt_embedding"] = embeddings[i]
+        requests = [
+            UpdateOne({"idempotency_key": doc["idempotency_key"]}, {"$setOnInsert": doc}, upsert=True)
+            if doc.get("idempotency_key") else InsertOne(doc)
+            for doc in batch
+        ]
+        # Keyed documents that matched an existing one were not written
+        skipped = set()
+        errors = []
+        try:
+            result = await self.collection.bulk_write(requests, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            upserted = {item["index"]: item["_id"] for item in e.details.get("upserted", [])}
+            # Ids and keys are assigned once, so a duplicate key means it is already stored
+            duplicates = [err for err in e.details.get("writeErrors", []) if err.get("code") == 11000]
+            errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+            skipped.update(err["index"] for err in duplicates)
+            if errors:
+                print(f"[Write Behind Error] {len(errors)} documents not written: {errors[0].get('errmsg')}")
+        failed = {err["index"] for err in errors}
+        skipped.update(
+            i for i, doc in enumerate(batch)
+            if doc.get("idempotency_key") and i not in upserted and i not in failed
+        )
+        self._written([doc for i, doc in enumerate(batch) if i not in skipped and i not in failed])
+        return [batch[i] for i in sorted(failed)]
+
+    async def _write_each(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Write documents one at a time with write_one; returns the ones that failed"""
+        remaining = []
+        for doc in batch:
+            try:
+                output_id = await self.write_one(doc)
+            except Exception as e:
+                print(f"[Write Behind Error] inline write of {doc['_id']} failed: {e}")
+                remaining.append(doc)
+                continue
+            # A different id means a document for its idempotency key was already stored
+            self._written([doc] if output_id == str(doc["_id"]) else [])
+        return remaining
+
+    async def _store(self, batch: List[Dict[str, Any]]) -> None:
+        """Write a batch, retrying until every document is stored"""
+        attempt = 0
+        while batch:
+            try:
+                if attempt >= self.max_retries and self.write_one is not None:
+                    batch = await self._write_each(batch)
+                else:
+                    batch = await self._write(batch)
+            except Exception as e:
+                print(f"[Write Behind Error] {len(batch)} documents not written (attempt {attempt + 1}): {e}")
+            if not batch:
+                return
+            self.failed += len(batch)
+            # Exponential backoff with jitter, capped so a long outage is still polled
+            await asyncio.sleep(min(self.max_backoff, 2 ** attempt) + random.random())
+            attempt += 1
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                await self._store(batch)
+            finally:
+                for doc in batch:
+                    self._pending.pop(doc["_id"], None)
+                    self._pending_keys.pop(doc.get("idempotency_key"), None)
+                    self._queue.task_done()
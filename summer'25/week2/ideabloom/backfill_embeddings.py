@@ -0,0 +1,118 @@
+# backfill_embeddings.py - Fill in missing embeddings on stored creative outputs
+#
+# Walks creative_outputs in _id order, embeds the outputs that have no
+# embedding with batched Gemini calls and writes them back with one bulk
+# write per page. The last _id processed is saved to a state file after
+# every page, so an interrupted run picks up where it stopped:
+#
+#     python backfill_embeddings.py
+#     python backfill_embeddings.py --restart   # ignore the saved position
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from backend.clients.gemini_client import GeminiClient
+from backend.utils.mongo import create_client, init_db, close_db
+
+load_dotenv()
+
+# Documents without an embedding, or with the empty one stored when embedding failed
+MISSING_EMBEDDING = {"$or": [
+    {"embedding": {"$exists": False}},
+    {"embedding": None},
+    {"embedding": {"$size": 0}}
+]}
+
+def load_state(path: str) -> Optional[ObjectId]:
+    """Return the last _id a previous run finished, if any"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return ObjectId(json.load(f)["last_id"])
+
+def save_state(path: str, last_id: ObjectId) -> None:
+    # Write then rename, so an interrupted run never leaves a half-written file
+    with open(path + ".tmp", "w") as f:
+        json.dump({"last_id": str(last_id)}, f)
+    os.replace(path + ".tmp", path)
+
+async def fetch_page(collection, after: Optional[ObjectId], page_size: int) -> List[Dict[str, Any]]:
+    query = dict(MISSING_EMBEDDING)
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    cursor = collection.find(query, {"output": 1}).sort("_id", 1).limit(page_size)
+    return await cursor.to_list(length=page_size)
+
+async def backfill(args: argparse.Namespace) -> None:
+    db = init_db(create_client(os.getenv("MONGO_URI")), os.getenv("DB_NAME", "creative_buddy"))
+    collection = db["creative_outputs"]
+
+    last_id = None if args.restart else load_state(args.state)
+    if last_id is not None:
+        print(f"Resuming after {last_id}")
+
+    embedded = failed = 0
+    start = time.perf_counter()
+    next_page = None
+    try:
+        async with GeminiClient() as gemini:
+            page = await fetch_page(collection, last_id, args.page_size)
+            while page:
+                # Fetch the next page while this one is being embedded
+                next_page = asyncio.create_task(fetch_page(collection, page[-1]["_id"], args.page_size))
+                embeddings = await gemini.batch_embeddings(
+                    [doc.get("output", "") for doc in page],
+                    batch_size=args.batch_size,
+                    max_concurrency=args.concurrency,
+                    max_retries=args.retries
+                )
+                updates = [
+                    # Skip documents that got an embedding since they were read
+                    UpdateOne({"_id": doc["_id"], **MISSING_EMBEDDING}, {"$set": {"embedding": embedding}})
+                    for doc, embedding in zip(page, embeddings) if embedding
+                ]
+                if updates:
+                    await collection.bulk_write(updates, ordered=False)
+                embedded += len(updates)
+                failed += len(page) - len(updates)
+
+                last_id = page[-1]["_id"]
+                save_state(args.state, last_id)
+                elapsed = time.perf_counter() - start
+                print(f"{embedded} embedded, {failed} failed, {embedded / elapsed:.1f} docs/s (last _id {last_id})")
+
+                if args.limit and embedded + failed >= args.limit:
+                    break
+                page = await next_page
+                next_page = None
+    finally:
+        # An error mid-page must not leave the prefetch running or the client open
+        if next_page is not None:
+            next_page.cancel()
+        close_db()
+
+    print(f"Done: {embedded} embedded, {failed} failed in {time.perf_counter() - start:.1f}s")
+    if failed:
+        print("Rerun with --restart to retry the failed documents")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fill in missing embeddings on creative outputs")
+    parser.add_argument("--page-size", type=int, default=1000, help="documents read and written per page")
+    parser.add_argument("--batch-size", type=int, default=100, help="texts per batch embedding request (max 100)")
+    parser.add_argument("--concurrency", type=int, default=4, help="embedding requests in flight at once")
+    parser.add_argument("--retries", type=int, default=3, help="retries per failed embedding request")
+    parser.add_argument("--limit", type=int, default=0, help="stop after this many documents (0 for all)")
+    parser.add_argument("--state", default="backfill_embeddings.state", help="file recording the last _id processed")
+    parser.add_argument("--restart", action="store_true", help="start from the beginning, ignoring the state file")
+    asyncio.run(backfill(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
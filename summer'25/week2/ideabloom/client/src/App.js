@@ -3,6 +3,34 @@ import { useAuth0 } from '@auth0/auth0-react';
 import InputBox from './components/InputBox';
 import OutputCard from './components/OutputCard';
 
+// Read a text/event-stream response body, calling onEvent(event, data) per event
+async function readEventStream(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  const dispatch = (raw) => {
+    let event = 'message';
+    const data = [];
+    for (const line of raw.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+    }
+    if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    // Events are separated by a blank line; keep any partial one for the next read
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    events.forEach(dispatch);
+  }
+  if (buffer.trim()) dispatch(buffer);
+}
+
 function App() {
   const { 
     loginWithRedirect, 
@@ -14,6 +42,8 @@ function App() {
   } = useAuth0();
   
   const [output, setOutput] = useState(null);
+  const [outputId, setOutputId] = useState(null);
+  const [streaming, setStreaming] = useState(false);
   const [sessionId, setSessionId] = useState(() => localStorage.getItem('session_id') || '');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -35,6 +65,8 @@ function App() {
 
     setLoading(true);
     setError(null);
+    setOutput(null);
+    setOutputId(null);
     
     try {
       // Get the access token
@@ -49,11 +81,14 @@ function App() {
         type: type,
       };
 
-      const res = await fetch(`${API_URL}/generate`, {
+      // Stream the output so text shows up as soon as the model produces it
+      const res = await fetch(`${API_URL}/generate/stream`, {
         method: "POST",
         headers: { 
           "Content-Type": "application/json",
-          "Authorization": `Bearer ${token}`
+          "Authorization": `Bearer ${token}`,
+          // One key per submission, so a retried request is stored only once
+          "Idempotency-Key": crypto.randomUUID()
         },
         body: JSON.stringify(payload),
       });
@@ -63,20 +98,32 @@ function App() {
         throw new Error(errorData.detail || "Error generating content");
       }
 
-      const data = await res.json();
-      
-      // Save session ID if it's new
-      if (data.session_id && (!sessionId || sessionId !== data.session_id)) {
-        localStorage.setItem("session_id", data.session_id);
-        setSessionId(data.session_id);
+      setStreaming(true);
+      let failure = null;
+      await readEventStream(res, (event, data) => {
+        if (event === 'message') {
+          setOutput((previous) => (previous || '') + data.text);
+        } else if (event === 'done') {
+          // Save session ID if it's new
+          if (data.session_id && (!sessionId || sessionId !== data.session_id)) {
+            localStorage.setItem("session_id", data.session_id);
+            setSessionId(data.session_id);
+          }
+          setOutput(data.output);
+          setOutputId(data.output_id);
+        } else if (event === 'error') {
+          failure = data.detail;
+        }
+      });
+      if (failure) {
+        throw new Error(failure);
       }
-
-      setOutput(data.output);
     } catch (err) {
       console.error("API Error:", err);
       setError(err.message || "Something went wrong");
     } finally {
       setLoading(false);
+      setStreaming(false);
     }
   };
 
@@ -113,14 +160,18 @@ function App() {
 
   // Updated OutputCard component to include feedback
   const renderOutput = () => {
-    if (!output) return null;
+    if (!output && !error) return null;
     
     return (
       <div className="mt-6">
-        <OutputCard 
-          text={output} 
-          onFeedback={submitFeedback} 
-        />
+        {output && (
+          <OutputCard 
+            text={output} 
+            outputId={outputId}
+            streaming={streaming}
+            onFeedback={submitFeedback} 
+          />
+        )}
         
         {error && (
           <div className="mt-4 p-3 bg-red-100 text-red-800 rounded">
@@ -151,7 +202,7 @@ function App() {
           </div>
         </div>
         
-        <InputBox onSubmit={handleSubmit} loading={loading} />
+        <InputBox onSubmit={handleSubmit} loading={loading} streaming={streaming} />
         {renderOutput()}
       </div>
     </div>
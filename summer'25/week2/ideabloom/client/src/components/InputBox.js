@@ -1,6 +1,6 @@
 import React, { useState } from 'react';
 
-function InputBox({ onSubmit, loading }) {
+function InputBox({ onSubmit, loading, streaming }) {
   const [input, setInput] = useState('');
   const [type, setType] = useState('poetry');
 
@@ -34,7 +34,7 @@ function InputBox({ onSubmit, loading }) {
           disabled={loading}
           className="bg-blue-600 text-white px-4 py-2 rounded hover:bg-blue-700"
         >
-          {loading ? 'Generating...' : 'Generate'}
+          {streaming ? 'Writing...' : loading ? 'Generating...' : 'Generate'}
         </button>
       </div>
     </form>
@@ -1,6 +1,6 @@
 import React, { useState } from 'react';
 
-function OutputCard({ text, outputId, onFeedback }) {
+function OutputCard({ text, outputId, streaming, onFeedback }) {
   const [feedback, setFeedback] = useState('');
   const [showFeedback, setShowFeedback] = useState(false);
   const [feedbackSubmitted, setFeedbackSubmitted] = useState(false);
@@ -17,7 +17,8 @@ function OutputCard({ text, outputId, onFeedback }) {
     <div className="bg-white p-6 border border-gray-200 shadow-md rounded-lg">
       <div className="flex justify-between items-center mb-4">
         <h2 className="text-xl font-semibold">✨ Generated Output</h2>
-        {!feedbackSubmitted && (
+        {/* Feedback needs the saved output's id, which arrives when the stream ends */}
+        {!feedbackSubmitted && outputId && (
           <button 
             onClick={() => setShowFeedback(!showFeedback)}
             className="text-sm text-blue-600 hover:text-blue-800"
@@ -30,6 +31,7 @@ function OutputCard({ text, outputId, onFeedback }) {
       <div className="prose max-w-none">
         <pre className="whitespace-pre-wrap text-gray-800 bg-gray-50 p-4 rounded">
           {text}
+          {streaming && <span className="animate-pulse">▍</span>}
         </pre>
       </div>
       
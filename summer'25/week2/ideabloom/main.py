@@ -1,26 +1,39 @@
 # main.py - Integrated FastAPI Application
 
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 from datetime import datetime
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
 import os
-import motor.motor_asyncio
-import httpx
-import uuid
-import jwt
 import json
-import requests
+import time
 from dotenv import load_dotenv
 
 # Import generator modules
-from backend.generators.poetry_generator import generate_poetry
-from backend.generators.melody_generator import generate_melody
-from backend.generators.game_script_generator import generate_game_script
-from backend.utils.utils import detect_extend_intent, build_prompt, generate_text_gemini, embed_text_gemini
-from backend.utils.mongo import save_creative_output, get_session_history, save_user_feedback
+from backend.generators.poetry_generator import generate_poetry, build_poetry_prompt
+from backend.generators.melody_generator import generate_melody, build_melody_prompt
+from backend.generators.game_script_generator import generate_game_script, build_game_script_prompt, extract_characters
+from backend.clients.gemini_client import GeminiClient
+from backend.utils.utils import (
+    detect_extend_intent, generate_text_gemini, stream_text_gemini, embed_text_gemini,
+    embed_texts_gemini, init_gemini,
+    find_similar_outputs
+)
+from backend.utils.mongo import (
+    build_creative_output, get_session_history, get_user_outputs, save_user_feedback,
+    scoped_idempotency_key, get_output_by_idempotency_key, upsert_creative_output,
+    get_user_settings, update_user_settings, ensure_indexes, create_client, init_db, close_db, ping
+)
+from backend.utils.write_behind import WriteBehindQueue
+from backend.utils.auth import JWKSCache, TokenVerifier
+from backend.utils.semantic_cache import SemanticCache
+from backend.utils.vector_index import LocalVectorIndex
 
 # Load env variables
 load_dotenv()
@@ -30,8 +43,110 @@ AUTH0_DOMAIN = os.getenv("AUTH0_DOMAIN")
 API_AUDIENCE = os.getenv("API_AUDIENCE")
 ALGORITHMS = ['RS256']  # JWT algorithm
 
+# How long a retry waits for the first attempt with the same Idempotency-Key
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "120"))
+
+# How long the semantic cache check trusts a user's settings before reading them again
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "60"))
+
+def index_written_outputs(documents: List[Dict[str, Any]]) -> None:
+    """Make stored outputs searchable: the local vector index and the semantic cache"""
+    if app.state.vector_index is not None:
+        app.state.vector_index.add_documents(documents)
+    if app.state.semantic_cache is not None:
+        app.state.semantic_cache.add_documents(documents)
+
+# --- Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared connection pools and background workers on startup, close them on shutdown"""
+    # The only Mongo client in the process; routes, generators and workers all use it
+    app.state.mongo = create_client(
+        os.getenv("MONGO_URI"),
+        max_pool_size=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        min_pool_size=int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        max_idle_time_ms=int(os.getenv("MONGO_MAX_IDLE_MS", "60000")),
+        server_selection_timeout_ms=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        connect_timeout_ms=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        socket_timeout_ms=int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+        write_concern=os.getenv("MONGO_WRITE_CONCERN", "majority"),
+        wtimeout_ms=int(os.getenv("MONGO_WTIMEOUT_MS", "5000")),
+    )
+    app.state.db = init_db(app.state.mongo, os.getenv("DB_NAME", "creative_buddy"))
+    outputs_collection = app.state.db["creative_outputs"]
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        # Queries still work without them, only slower
+        print(f"[Mongo Index Error] {e}")
+    # One pooled Gemini client for the whole app; generation and embedding calls
+    # in backend.utils.utils go through it, so requests reuse warm connections
+    app.state.gemini = None
+    if os.getenv("GEMINI_API_KEY"):
+        app.state.gemini = GeminiClient(
+            max_connections=int(os.getenv("GEMINI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("GEMINI_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "30")),
+            http2=os.getenv("GEMINI_HTTP2", "1") == "1",
+        )
+        init_gemini(app.state.gemini)
+    else:
+        # Start anyway so health checks and history work; generation requests fail until it is set
+        print("[Gemini Client Error] GEMINI_API_KEY is not set")
+    # Similarity search runs on Atlas Search by default; "local" keeps an in-process
+    # index instead, built in the background and updated as outputs are written
+    app.state.vector_index = None
+    index_loader = None
+    if os.getenv("VECTOR_SEARCH", "atlas") == "local":
+        app.state.vector_index = LocalVectorIndex(
+            nprobe=int(os.getenv("VECTOR_INDEX_NPROBE", "8")),
+            train_threshold=int(os.getenv("VECTOR_INDEX_TRAIN_THRESHOLD", "20000")),
+        )
+        index_loader = asyncio.create_task(app.state.vector_index.load(outputs_collection))
+    # Embedding and saving outputs happens here, off the request path
+    app.state.write_behind = WriteBehindQueue(
+        outputs_collection,
+        embed_texts_gemini,
+        batch_size=int(os.getenv("WRITE_BATCH_SIZE", "32")),
+        max_wait=float(os.getenv("WRITE_BATCH_WAIT", "0.2")),
+        on_write=index_written_outputs,
+        # Batches that keep failing are written one document at a time, as persist_output does
+        write_one=upsert_creative_output,
+        max_retries=int(os.getenv("WRITE_MAX_RETRIES", "5")),
+    )
+    app.state.write_behind.start()
+    # Idempotency keys whose first attempt is still generating: scoped key -> (request hash, future)
+    app.state.in_flight = {}
+    # Optional: serve near-identical fresh prompts from earlier outputs
+    app.state.semantic_cache = None
+    # user_id -> (expiry, settings), so cache checks don't read settings on every request
+    app.state.user_settings = {}
+    if os.getenv("SEMANTIC_CACHE", "0") == "1":
+        app.state.semantic_cache = SemanticCache(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "86400")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "10000")),
+            # Off by default: a user's outputs are only ever served back to them
+            shared=os.getenv("SEMANTIC_CACHE_SHARED", "0") == "1",
+        )
+        try:
+            await app.state.semantic_cache.load(outputs_collection)
+        except Exception as e:
+            print(f"[Semantic Cache Error] warm-up failed: {e}")
+    try:
+        yield
+    finally:
+        # Drain queued outputs first: the worker embeds them (embed_texts_gemini) through the pooled client closed below
+        await app.state.write_behind.stop()
+        if app.state.gemini is not None:
+            init_gemini(None)
+            await app.state.gemini.aclose()
+        if index_loader is not None:
+            index_loader.cancel()
+        close_db()
+
 # --- Init ---
-app = FastAPI(title="Creative Buddy API")
+app = FastAPI(title="Creative Buddy API", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], 
@@ -40,10 +155,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB Connection
-client = motor.motor_asyncio.AsyncIOMotorClient(os.getenv("MONGO_URI"))
-db = client[os.getenv("DB_NAME", "creative_buddy")]
-
 # Gemini API Configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
@@ -66,62 +177,293 @@ class FeedbackRequest(BaseModel):
 class HistoryRequest(BaseModel):
     user_id: str
     session_id: str
+    limit: int = 10
+    cursor: Optional[str] = None  # next_cursor from the previous page
+
+class OutputsRequest(BaseModel):
+    user_id: str
+    type: Optional[str] = None  # poetry | melody | script
+    limit: int = 20
+    cursor: Optional[str] = None  # next_cursor from the previous page
+
+class SimilarRequest(BaseModel):
+    user_id: str
+    query: str
+    type: Optional[str] = None  # poetry | melody | script
+    limit: int = 5
+
+class SettingsRequest(BaseModel):
+    user_id: str
+    semantic_cache: Optional[bool] = None  # False opts the user out of cached outputs
 
 # --- Auth Helper Functions ---
-def get_jwks():
-    """Fetch the JSON Web Key Set from Auth0"""
-    url = f"https://{AUTH0_DOMAIN}/.well-known/jwks.json"
-    response = requests.get(url)
-    return response.json()
+# Signing keys are fetched asynchronously, parsed once and cached; verified
+# tokens are remembered until they expire
+token_verifier = TokenVerifier(
+    JWKSCache(
+        f"https://{AUTH0_DOMAIN}/.well-known/jwks.json",
+        ttl=float(os.getenv("JWKS_TTL", "3600"))
+    ),
+    audience=API_AUDIENCE,
+    issuer=f"https://{AUTH0_DOMAIN}/",
+    algorithms=ALGORITHMS,
+    cache_size=int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+)
 
-def verify_jwt(token: str) -> Dict[str, Any]:
+async def verify_jwt(token: str) -> Dict[str, Any]:
     """Verify JWT token and return decoded payload if valid"""
-    try:
-        # Get the public key
-        jwks = get_jwks()
-        unverified_header = jwt.get_unverified_header(token)
-        
-        # Find the matching key
-        rsa_key = {}
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"]
-                }
-                break
-        
-        if not rsa_key:
-            raise HTTPException(status_code=401, detail="Unable to find appropriate key")
-        
-        # Verify the token
-        payload = jwt.decode(
-            token,
-            jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(rsa_key)),
-            algorithms=ALGORITHMS,
-            audience=API_AUDIENCE,
-            issuer=f"https://{AUTH0_DOMAIN}/"
-        )
-        
-        return payload
-    
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTClaimsError:
-        raise HTTPException(status_code=401, detail="Invalid claims, check audience and issuer")
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Authentication error: {str(e)}")
+    return await token_verifier.verify(token)
+
+# Database dependency
+def get_db(request: Request):
+    """Return the app-wide Mongo database handle"""
+    return request.app.state.db
 
 # Auth dependency
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Validate the token and return user info"""
     token = credentials.credentials
-    payload = verify_jwt(token)
+    payload = await verify_jwt(token)
     return payload
 
+# Prompt builders used by the streaming endpoint, keyed by request type
+PROMPT_BUILDERS = {
+    "poetry": build_poetry_prompt,
+    "melody": build_melody_prompt,
+    "script": build_game_script_prompt,
+}
+
+async def get_previous_output(request: GenerateRequest) -> Optional[str]:
+    """Return the last output of the session if the request asks to extend it"""
+    if request.session_id and detect_extend_intent(request.input_text):
+        # The latest output may still be waiting in the write-behind queue
+        pending = app.state.write_behind.pending(request.session_id)
+        if pending:
+            return max(pending, key=lambda doc: doc["timestamp"]).get("output", "")
+        # Get the most recent history item for this session
+        history = await get_session_history(request.session_id, limit=1, newest_first=True)
+        if history["items"]:
+            return history["items"][0].get("output", "")
+    return None
+
+async def get_cached_user_settings(user_id: str) -> Dict[str, Any]:
+    """A user's settings, read from the database at most once per SETTINGS_CACHE_TTL"""
+    cached = app.state.user_settings.get(user_id)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    settings = await get_user_settings(user_id)
+    now = time.monotonic()
+    if len(app.state.user_settings) >= 10000:
+        # Forget users whose entries have expired rather than growing without bound
+        app.state.user_settings = {k: v for k, v in app.state.user_settings.items() if v[0] > now}
+    app.state.user_settings[user_id] = (now + SETTINGS_CACHE_TTL, settings)
+    return settings
+
+async def lookup_semantic_cache(
+    request: GenerateRequest,
+    previous_output: Optional[str]
+) -> Dict[str, Any]:
+    """Look the prompt up in the semantic cache, if it applies to this request
+    
+    Args:
+        request: The generation request
+        previous_output: Output being extended, if any
+        
+    Returns:
+        Dict with "hit" (cached entry or None) and, when the cache applies, the
+        "cache_key" to store with a fresh output. The prompt is only embedded
+        here when its partition has entries; otherwise the write-behind worker
+        embeds it with the output and no "prompt_embedding" is returned
+    """
+    cache = app.state.semantic_cache
+    if cache is None or request.type not in PROMPT_BUILDERS:
+        return {"hit": None}
+    # Extensions depend on the previous output, so they are never served from cache
+    if previous_output is not None:
+        cache.skip()
+        return {"hit": None}
+    settings = await get_cached_user_settings(request.user_id)
+    if settings.get("semantic_cache") is False:
+        cache.skip()
+        return {"hit": None}
+    
+    _, partition = PROMPT_BUILDERS[request.type](request.input_text)
+    cache_key = cache.partition_key(partition, request.user_id)
+    if not cache.has_entries(cache_key):
+        # Nothing to match against, so skip the embedding round-trip
+        cache.miss()
+        return {"hit": None, "cache_key": cache_key}
+    # Same task type as the prompts the write-behind worker embeds
+    prompt_embedding = await embed_text_gemini(request.input_text)
+    if not prompt_embedding:
+        # Still a lookup that found nothing, or the hit rate would overstate the cache
+        cache.miss()
+        return {"hit": None, "cache_key": cache_key}
+    return {
+        "hit": cache.lookup(prompt_embedding, cache_key),
+        "prompt_embedding": prompt_embedding,
+        "cache_key": cache_key
+    }
+
+def request_hash(request: GenerateRequest) -> str:
+    """Fingerprint of the request fields an idempotency key stands for"""
+    body = {"type": request.type, "input_text": request.input_text, "session_id": request.session_id}
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()
+
+def check_request_hash(expected: Optional[str], request: GenerateRequest) -> None:
+    # Documents stored before request hashes were recorded can't be checked
+    if expected is not None and expected != request_hash(request):
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+async def find_replay(request: GenerateRequest, idempotency_key: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Return the output already produced for a retried request, or claim its key
+    
+    A retry that arrives while the first attempt is still generating waits
+    for that attempt's output instead of generating its own. When nothing
+    has been produced for the key yet, the caller holds the key until it
+    calls settle_in_flight() (persist_output does this on success).
+    
+    Args:
+        request: The generation request
+        idempotency_key: Value of the request's Idempotency-Key header
+        
+    Returns:
+        The stored (or still queued) output document, or None if the caller
+        should generate it
+        
+    Raises:
+        HTTPException: 422 if the key was used for a request with a different body,
+            409 if the first attempt is still running after IDEMPOTENCY_WAIT_TIMEOUT
+    """
+    if not idempotency_key:
+        return None
+    key = scoped_idempotency_key(request.user_id, idempotency_key)
+    while True:
+        in_flight = app.state.in_flight.get(key)
+        if in_flight is not None:
+            expected, future = in_flight
+            check_request_hash(expected, request)
+            try:
+                document = await asyncio.wait_for(asyncio.shield(future), timeout=IDEMPOTENCY_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still in progress; retry later"
+                )
+            if document is not None:
+                return document
+            # The first attempt failed; try again to claim the key
+            continue
+        document = app.state.write_behind.find_pending(key) or await get_output_by_idempotency_key(key)
+        if document is not None:
+            check_request_hash(document.get("request_hash"), request)
+            return document
+        # Another attempt may have claimed the key while the lookup was awaited
+        if key not in app.state.in_flight:
+            app.state.in_flight[key] = (request_hash(request), asyncio.get_running_loop().create_future())
+            return None
+
+def settle_in_flight(key: str, document: Optional[Dict[str, Any]]) -> None:
+    """Release a claimed idempotency key, handing retries waiting on it the output (None if it failed)"""
+    entry = app.state.in_flight.pop(key, None)
+    if entry is not None and not entry[1].done():
+        entry[1].set_result(document)
+
+def replay_response(document: Dict[str, Any]) -> Dict[str, Any]:
+    """The /generate response for an output found by find_replay"""
+    return {
+        "output": document.get("output", ""),
+        "session_id": document["session_id"],
+        "output_id": str(document["_id"]),
+        "mode": document.get("mode", "new"),
+        "cached": "cached_from" in document,
+        "replayed": True,
+        **{k: document[k] for k in ("notation_type", "script_type", "characters") if k in document}
+    }
+
+def cached_result(request: GenerateRequest, hit: Dict[str, Any]) -> Dict[str, Any]:
+    """Generator-style result for an output served from the semantic cache"""
+    return {"output": hit["output"], "type": request.type, "mode": "new", **hit["metadata"]}
+
+async def persist_output(
+    request: GenerateRequest,
+    output: str,
+    result: Dict[str, Any],
+    cache_lookup: Optional[Dict[str, Any]] = None,
+    idempotency_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """Queue an output to be embedded and saved in the background
+    
+    This is the only place generated outputs are stored, so each generation
+    becomes exactly one document.
+    
+    Args:
+        request: The generation request the output answers
+        output: Generated output text
+        result: Generator metadata (type, mode and type-specific fields)
+        cache_lookup: What lookup_semantic_cache returned for the request, if anything
+        idempotency_key: Client key; retries with the same key share one document
+        
+    Returns:
+        Dict with the session_id and the output_id the document will be stored under
+    """
+    metadata = {k: v for k, v in result.items() if k not in ["output", "type", "mode"]}
+    document = build_creative_output(
+        request.user_id,
+        request.input_text,
+        output,
+        request.type,
+        request.session_id,
+        result.get("mode", "new"),
+        metadata,
+        idempotency_key=idempotency_key
+    )
+    if idempotency_key:
+        # Lets find_replay turn away a reused key whose request body differs
+        document["request_hash"] = request_hash(request)
+    cache_lookup = cache_lookup or {}
+    hit = cache_lookup.get("hit")
+    if hit is not None:
+        document["cached_from"] = hit["output_id"]
+    elif cache_lookup.get("cache_key") and result.get("mode", "new") == "new":
+        # Stored so the cache (and a restarted server warming it) can serve this output;
+        # the prompt is embedded with the output unless the lookup already did it
+        document["cache_key"] = cache_lookup["cache_key"]
+        if cache_lookup.get("prompt_embedding"):
+            document["prompt_embedding"] = cache_lookup["prompt_embedding"]
+    try:
+        output_id = app.state.write_behind.enqueue(document)
+    except asyncio.QueueFull:
+        # The writer is backed up; save inline rather than drop the output
+        document["embedding"] = await embed_text_gemini(output)
+        if "cache_key" in document and not document.get("prompt_embedding"):
+            document["prompt_embedding"] = await embed_text_gemini(request.input_text)
+        output_id = await upsert_creative_output(document)
+        if output_id == str(document["_id"]):
+            index_written_outputs([document])
+    
+    if idempotency_key:
+        # Retries waiting on the key get this output; if another process stored one first, they look it up
+        settle_in_flight(document["idempotency_key"], document if output_id == str(document["_id"]) else None)
+    return {"session_id": document["session_id"], "output_id": output_id}
+
+def format_output(item: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-friendly view of a stored output for history-style responses"""
+    return {
+        "input": item.get("input_text", ""),
+        "output": item.get("output", ""),
+        "type": item.get("type", ""),
+        "timestamp": item.get("timestamp", "").isoformat() 
+        if isinstance(item.get("timestamp"), datetime) 
+        else item.get("timestamp", ""),
+        "id": str(item.get("_id", ""))
+    }
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format one server-sent event with a JSON payload"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
 # --- Routes ---
 @app.get("/")
 async def root():
@@ -131,54 +473,60 @@ async def root():
         "version": "1.0.0",
         "endpoints": [
             {"path": "/generate", "method": "POST", "description": "Generate creative content"},
+            {"path": "/generate/stream", "method": "POST", "description": "Generate creative content, streamed as server-sent events"},
             {"path": "/feedback", "method": "POST", "description": "Provide feedback on generated content"},
-            {"path": "/history", "method": "POST", "description": "Get session history"}
+            {"path": "/history", "method": "POST", "description": "Get session history, paginated with next_cursor"},
+            {"path": "/outputs", "method": "POST", "description": "List the user's outputs, paginated with next_cursor"},
+            {"path": "/similar", "method": "POST", "description": "Find the user's outputs most similar to a query"},
+            {"path": "/settings", "method": "POST", "description": "Update user settings (e.g. semantic cache opt-out)"},
+            {"path": "/cache/stats", "method": "GET", "description": "Semantic cache hit-rate metrics"},
+            {"path": "/health", "method": "GET", "description": "Database reachability and ping latency"}
         ]
     }
 
 @app.post("/generate")
-async def generate_creative(request: GenerateRequest, user: Dict = Depends(get_current_user)):
-    """Generate creative content based on user input"""
+async def generate_creative(
+    request: GenerateRequest,
+    user: Dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Generate creative content based on user input
+    
+    Clients may send an Idempotency-Key header; retrying with the same key
+    returns the output of the first attempt instead of generating again.
+    """
     
     # Validate that the requesting user matches the user_id in the request
     if user.get("sub") != request.user_id:
         raise HTTPException(status_code=403, detail="User ID mismatch")
     
-    # Get context from previous interactions if this is an extension
-    previous_output = None
-    
-    if request.session_id:
-        # Get the most recent history item for this session
-        history = await get_session_history(request.session_id, limit=1)
-        if history and detect_extend_intent(request.input_text):
-            previous_output = history[0].get("output", "")
+    replay = await find_replay(request, idempotency_key)
+    if replay is not None:
+        return replay_response(replay)
     
     try:
+        # Get context from previous interactions if this is an extension
+        previous_output = await get_previous_output(request)
+        cache_lookup = await lookup_semantic_cache(request, previous_output)
+        
         # Use the appropriate generator based on content type
-        if request.type == "poetry":
+        if cache_lookup["hit"] is not None:
+            result = cached_result(request, cache_lookup["hit"])
+        elif request.type == "poetry":
             result = await generate_poetry(
-                db, 
-                request.user_id, 
                 request.input_text, 
-                request.session_id, 
                 previous_output, 
                 generate_text_gemini
             )
         elif request.type == "melody":
             result = await generate_melody(
-                db, 
-                request.user_id, 
                 request.input_text, 
-                request.session_id, 
                 previous_output, 
                 generate_text_gemini
             )
         elif request.type == "script":
             result = await generate_game_script(
-                db, 
-                request.user_id, 
                 request.input_text, 
-                request.session_id, 
                 previous_output, 
                 generate_text_gemini
             )
@@ -188,21 +536,9 @@ async def generate_creative(request: GenerateRequest, user: Dict = Depends(get_c
         # Get the output from the result
         output = result.get("output", "")
         
-        # Generate embedding for semantic search
-        embedding = await embed_text_gemini(output)
-        
-        # Save to database with common fields and any additional metadata
+        # Embedding and saving happen in the background; the id is already final
         metadata = {k: v for k, v in result.items() if k not in ["output", "type", "mode"]}
-        save_result = await save_creative_output(
-            request.user_id,
-            request.input_text,
-            output,
-            request.type,
-            request.session_id,
-            result.get("mode", "new"),
-            metadata,
-            embedding
-        )
+        save_result = await persist_output(request, output, result, cache_lookup, idempotency_key)
         
         # Return the result with session information
         return {
@@ -210,11 +546,107 @@ async def generate_creative(request: GenerateRequest, user: Dict = Depends(get_c
             "session_id": save_result["session_id"],
             "output_id": save_result["output_id"],
             "mode": result.get("mode", "new"),
+            "cached": cache_lookup["hit"] is not None,
             **metadata  # Include any specialized metadata from the generators
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating content: {str(e)}")
+    finally:
+        # No-op once persist_output has settled it; otherwise lets waiting retries generate
+        if idempotency_key:
+            settle_in_flight(scoped_idempotency_key(request.user_id, idempotency_key), None)
+
+@app.post("/generate/stream")
+async def generate_creative_stream(
+    request: GenerateRequest,
+    user: Dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """Generate creative content, forwarding text to the client as it is produced
+    
+    The response is a text/event-stream. Each "message" event carries a text
+    chunk as {"text": ...}. Once the model has finished, the output is queued
+    for embedding and saving, and a final "done" event carries the same fields
+    /generate returns (output_id, session_id, mode and metadata). Failures are
+    reported as an "error" event with {"detail": ...}. A retry with the same
+    Idempotency-Key header replays the first attempt's output as one chunk;
+    reusing a key for a different request is an "error" event with a
+    "status_code" of 422.
+    """
+    
+    # Validate that the requesting user matches the user_id in the request
+    if user.get("sub") != request.user_id:
+        raise HTTPException(status_code=403, detail="User ID mismatch")
+    
+    build_prompt_fn = PROMPT_BUILDERS.get(request.type)
+    if build_prompt_fn is None:
+        raise HTTPException(status_code=400, detail=f"Unsupported content type: {request.type}")
+    
+    async def events():
+        chunks = []
+        claimed = False
+        try:
+            # A retry is answered before any work on the prompt. The key is claimed and
+            # released in here, so a client that disconnects before the stream starts
+            # never leaves it held
+            replay = await find_replay(request, idempotency_key)
+            if replay is not None:
+                response = replay_response(replay)
+                yield sse_event({"text": response["output"]})
+                yield sse_event(response, event="done")
+                return
+            claimed = bool(idempotency_key)
+            
+            # Get context from previous interactions if this is an extension
+            previous_output = await get_previous_output(request)
+            prompt, result = build_prompt_fn(request.input_text, previous_output)
+            
+            cache_lookup = await lookup_semantic_cache(request, previous_output)
+            if cache_lookup["hit"] is not None:
+                # Cached outputs go out as a single chunk
+                cached = cached_result(request, cache_lookup["hit"])
+                output = cached.pop("output")
+                result.update(cached)
+                yield sse_event({"text": output})
+            else:
+                async for text in stream_text_gemini(prompt):
+                    chunks.append(text)
+                    yield sse_event({"text": text})
+                output = "".join(chunks).strip()
+            
+            # Everything below runs after the client already has the full text
+            if request.type == "script":
+                result["characters"] = extract_characters(output)
+            metadata = {k: v for k, v in result.items() if k not in ["output", "type", "mode"]}
+            save_result = await persist_output(request, output, result, cache_lookup, idempotency_key)
+            
+            yield sse_event({
+                "output": output,
+                "session_id": save_result["session_id"],
+                "output_id": save_result["output_id"],
+                "mode": result.get("mode", "new"),
+                "cached": cache_lookup["hit"] is not None,
+                **metadata
+            }, event="done")
+        
+        except HTTPException as e:
+            # e.g. the Idempotency-Key was already used for a different request
+            yield sse_event({"detail": e.detail, "status_code": e.status_code}, event="error")
+        except Exception as e:
+            yield sse_event({"detail": f"Error generating content: {str(e)}"}, event="error")
+        finally:
+            if claimed:
+                settle_in_flight(scoped_idempotency_key(request.user_id, idempotency_key), None)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/feedback")
 async def provide_feedback(
@@ -228,6 +660,10 @@ async def provide_feedback(
         raise HTTPException(status_code=403, detail="User ID mismatch")
     
     try:
+        # Feedback can arrive before the output itself has been written
+        if app.state.write_behind.is_pending(request.output_id):
+            await app.state.write_behind.flush()
+        
         # Save the feedback
         result = await save_user_feedback(
             request.user_id,
@@ -258,29 +694,120 @@ async def get_history(
         raise HTTPException(status_code=403, detail="User ID mismatch")
     
     try:
-        # Get the session history
-        history = await get_session_history(request.session_id)
+        # Get one page of the session history
+        history = await get_session_history(
+            request.session_id,
+            limit=min(max(request.limit, 1), 100),
+            cursor=request.cursor
+        )
         
         # Return formatted results
         return {
             "session_id": request.session_id,
-            "history": [
-                {
-                    "input": item.get("input_text", ""),
-                    "output": item.get("output", ""),
-                    "type": item.get("type", ""),
-                    "timestamp": item.get("timestamp", "").isoformat() 
-                    if isinstance(item.get("timestamp"), datetime) 
-                    else item.get("timestamp", ""),
-                    "id": str(item.get("_id", ""))
-                }
-                for item in history
-            ]
+            "history": [format_output(item) for item in history["items"]],
+            "next_cursor": history["next_cursor"]
         }
     
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving history: {str(e)}")
 
+@app.post("/outputs")
+async def list_outputs(
+    request: OutputsRequest,
+    user: Dict = Depends(get_current_user)
+):
+    """List the user's outputs, newest first, one page at a time"""
+    
+    # Validate the user
+    if user.get("sub") != request.user_id:
+        raise HTTPException(status_code=403, detail="User ID mismatch")
+    
+    try:
+        page = await get_user_outputs(
+            request.user_id,
+            request.type,
+            limit=min(max(request.limit, 1), 100),
+            cursor=request.cursor
+        )
+        return {
+            "outputs": [format_output(item) for item in page["items"]],
+            "next_cursor": page["next_cursor"]
+        }
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving outputs: {str(e)}")
+
+@app.post("/similar")
+async def similar_outputs(
+    request: SimilarRequest,
+    user: Dict = Depends(get_current_user),
+    db = Depends(get_db)
+):
+    """Find the user's past outputs most similar to a query"""
+    
+    # Validate the user
+    if user.get("sub") != request.user_id:
+        raise HTTPException(status_code=403, detail="User ID mismatch")
+    
+    results = await find_similar_outputs(
+        db,
+        request.query,
+        user_id=request.user_id,
+        content_type=request.type,
+        limit=min(max(request.limit, 1), 50),
+        index=app.state.vector_index
+    )
+    return {
+        "results": [
+            {**format_output(item), "score": item.get("score")}
+            for item in results
+        ]
+    }
+
+@app.post("/settings")
+async def update_settings(
+    request: SettingsRequest,
+    user: Dict = Depends(get_current_user)
+):
+    """Update the requesting user's settings"""
+    
+    # Validate the user
+    if user.get("sub") != request.user_id:
+        raise HTTPException(status_code=403, detail="User ID mismatch")
+    
+    changes = request.dict(exclude={"user_id"}, exclude_none=True)
+    try:
+        settings = await update_user_settings(request.user_id, changes) if changes \
+            else await get_user_settings(request.user_id)
+        app.state.user_settings.pop(request.user_id, None)
+        return {"user_id": request.user_id, "settings": settings}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating settings: {str(e)}")
+
+@app.get("/cache/stats")
+async def semantic_cache_stats(
+    user: Dict = Depends(get_current_user)
+):
+    """Hit-rate metrics for the semantic response cache"""
+    cache = app.state.semantic_cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.get("/health")
+async def health():
+    """Liveness of the API and round-trip latency to MongoDB"""
+    try:
+        latency_ms = await ping()
+    except Exception as e:
+        print(f"[Health Check Error] {e}")
+        raise HTTPException(status_code=503, detail=f"Database unreachable: {str(e)}")
+    return {"status": "ok", "mongo": {"latency_ms": round(latency_ms, 2)}}
+
 # --- Main Entry Point ---
 if __name__ == "__main__":
     import uvicorn
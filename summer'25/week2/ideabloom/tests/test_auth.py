@@ -0,0 +1,97 @@
+# tests/test_auth.py - TokenVerifier against a stub JWKS endpoint
+#
+# Run from the ideabloom directory:
+#
+#     python -m pytest tests
+
+import asyncio
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+
+from backend.utils.auth import JWKSCache, TokenVerifier
+
+AUDIENCE = "https://api.ideabloom.test"
+ISSUER = "https://auth.ideabloom.test/"
+
+def make_key(kid: str):
+    """A fresh RSA private key and its public JWK"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": kid, "use": "sig", "alg": "RS256"})
+    return private_key, jwk
+
+def make_token(private_key, kid: str, sub: str = "user-1") -> str:
+    claims = {"sub": sub, "aud": AUDIENCE, "iss": ISSUER, "exp": int(time.time()) + 300}
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+class StubJWKS:
+    """Stands in for the JWKS endpoint; counts fetches and serves whatever keys it holds"""
+
+    def __init__(self, *jwks):
+        self.keys = list(jwks)
+        self.fetches = 0
+
+    async def __call__(self, url: str):
+        self.fetches += 1
+        return {"keys": list(self.keys)}
+
+def make_verifier(stub: StubJWKS, min_refresh_interval: float = 0) -> TokenVerifier:
+    jwks = JWKSCache("https://auth.ideabloom.test/.well-known/jwks.json",
+                     min_refresh_interval=min_refresh_interval, fetcher=stub)
+    return TokenVerifier(jwks, AUDIENCE, ISSUER)
+
+def test_verifies_token_and_caches_it():
+    private_key, jwk = make_key("k1")
+    stub = StubJWKS(jwk)
+    verifier = make_verifier(stub)
+    token = make_token(private_key, "k1")
+
+    assert asyncio.run(verifier.verify(token))["sub"] == "user-1"
+    assert asyncio.run(verifier.verify(token))["sub"] == "user-1"
+    assert stub.fetches == 1
+
+def test_key_rotation_refetches_jwks():
+    old_key, old_jwk = make_key("k1")
+    new_key, new_jwk = make_key("k2")
+    stub = StubJWKS(old_jwk)
+    verifier = make_verifier(stub)
+
+    async def scenario():
+        assert (await verifier.verify(make_token(old_key, "k1")))["sub"] == "user-1"
+        # The provider rotates: k2 is published and k1 retired
+        stub.keys = [new_jwk]
+        payload = await verifier.verify(make_token(new_key, "k2", sub="user-2"))
+        assert payload["sub"] == "user-2"
+
+    asyncio.run(scenario())
+    assert stub.fetches == 2
+
+def test_unknown_kid_is_rejected_and_refreshes_are_rate_limited():
+    private_key, jwk = make_key("k1")
+    stub = StubJWKS(jwk)
+    verifier = make_verifier(stub, min_refresh_interval=60)
+
+    async def scenario():
+        await verifier.verify(make_token(private_key, "k1"))
+        for kid in ("unknown-1", "unknown-2"):
+            with pytest.raises(HTTPException) as error:
+                await verifier.verify(make_token(private_key, kid))
+            assert error.value.status_code == 401
+
+    asyncio.run(scenario())
+    # Tokens with made-up kids don't trigger a refetch within min_refresh_interval
+    assert stub.fetches == 1
+
+def test_token_signed_with_wrong_key_is_rejected():
+    _, jwk = make_key("k1")
+    forged_key, _ = make_key("k1")
+    verifier = make_verifier(StubJWKS(jwk))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(verifier.verify(make_token(forged_key, "k1")))
+    assert error.value.status_code == 401